@@ -0,0 +1,124 @@
+"""Сборка индекса имен и время запросов к нему на синтетическом списке имен
+
+Для сравнения меряется и линейный перебор имен (как клиент искал раньше).
+Время запроса - медиана по --queries случайным запросам, в микросекундах.
+
+Запуск: python GB/GraphBuilder/benchmarks/bench_room_search.py [--names 50000] [--json results.json]
+"""
+
+import argparse
+import gzip
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from room_search import RoomSearchIndex, build_search_index, normalize_name  # noqa: E402
+
+
+WORDS = [
+    "деканат",
+    "кафедра",
+    "лаборатория",
+    "аудитория",
+    "туалет",
+    "столовая",
+    "библиотека",
+    "гардероб",
+    "буфет",
+    "приемная",
+    "компьютерный класс",
+    "читальный зал",
+]
+KORPUSA = ["матмех", "куйбышева", "физфак", "химфак"]
+
+
+def synthetic_names(count: int, seed: int = 0) -> list:
+    """Номера кабинетов с литерами и составные имена вперемешку"""
+    rnd = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        if rnd.random() < 0.7:
+            name = str(rnd.randint(100, 99999))
+            if rnd.random() < 0.2:
+                name += rnd.choice("абвг")
+        else:
+            name = f"{rnd.choice(WORDS)} {rnd.choice(KORPUSA)} {rnd.randint(1, 999)}"
+        names.add(name)
+    return sorted(names)
+
+
+def typo(name: str, rnd: random.Random) -> str:
+    """Имя с одной замененной буквой и латинской "a" вместо кириллической"""
+    i = rnd.randrange(len(name))
+    name = name[:i] + rnd.choice("аеиоу") + name[i + 1 :]
+    return name.replace("а", "a", 1)
+
+
+def median_us(function, queries) -> float:
+    times = []
+    for query in queries:
+        start = time.perf_counter()
+        function(query)
+        times.append(time.perf_counter() - start)
+    return round(statistics.median(times) * 1e6, 1)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--json", help="куда записать результаты")
+    arg_parser.add_argument("--names", type=int, default=50000)
+    arg_parser.add_argument("--queries", type=int, default=2000)
+    args = arg_parser.parse_args()
+
+    rnd = random.Random(1)
+    names = synthetic_names(args.names)
+
+    start = time.perf_counter()
+    data = build_search_index(names)
+    build_seconds = time.perf_counter() - start
+    raw = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode()
+
+    start = time.perf_counter()
+    index = RoomSearchIndex(json.loads(raw))
+    load_seconds = time.perf_counter() - start
+
+    sample = [rnd.choice(names) for _ in range(args.queries)]
+    prefixes = [name[: rnd.randint(1, min(4, len(name)))] for name in sample]
+    typos = [typo(name, rnd) for name in sample]
+    keys = [normalize_name(name) for name in names]
+
+    def linear_scan(query):
+        query = normalize_name(query)
+        return [name for name, key in zip(names, keys) if query in key][:10]
+
+    result = {
+        "names": len(names),
+        "build_seconds": round(build_seconds, 3),
+        "load_seconds": round(load_seconds, 3),
+        "index_bytes": len(raw),
+        "index_gzip_bytes": len(gzip.compress(raw, mtime=0)),
+        "prefix_us": median_us(index.prefix, prefixes),
+        "fuzzy_us": median_us(index.fuzzy, typos),
+        "search_us": median_us(index.search, prefixes),
+        "linear_scan_us": median_us(linear_scan, prefixes[:200]),
+        "fuzzy_hit_rate": round(
+            sum(name in [n for n, _ in index.fuzzy(q)] for name, q in zip(sample, typos))
+            / len(sample),
+            3,
+        ),
+    }
+    for name, value in result.items():
+        print(f"{name:>16} {value}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
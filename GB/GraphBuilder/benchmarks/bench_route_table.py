@@ -0,0 +1,87 @@
+"""Время сборки и размер таблицы маршрутов в зависимости от числа кабинетов
+
+Запуск: python GB/GraphBuilder/benchmarks/bench_route_table.py [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from graph_csr import load_csr_graph, write_csr_graph  # noqa: E402
+from route_table import build_route_table  # noqa: E402
+
+
+def synthetic_floor(rooms_count: int, seed: int = 0):
+    """Коридоры-решетка в 3 ряда и по тупиковой вершине на каждый кабинет"""
+    rnd = random.Random(seed)
+    columns = max(2, rooms_count)
+    graph = {}
+
+    def link(a, b):
+        graph.setdefault(a, []).append(b)
+        graph.setdefault(b, []).append(a)
+
+    corridor = [[f"{x * 50} {y * 100} synthetic_1" for x in range(columns)] for y in range(3)]
+    for y in range(3):
+        for x in range(columns):
+            if x > 0:
+                link(corridor[y][x - 1], corridor[y][x])
+            if y > 0 and x % 5 == 0:
+                link(corridor[y - 1][x], corridor[y][x])
+
+    names = {}
+    for i in range(rooms_count):
+        x, y = rnd.randrange(columns), rnd.randrange(3)
+        room_node = f"{x * 50 + 7} {y * 100 + 25} synthetic_1"
+        if room_node not in graph:
+            link(corridor[y][x], room_node)
+        names[f"room {i}"] = room_node
+    return graph, names
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--json", help="куда записать результаты")
+    arg_parser.add_argument(
+        "--rooms", type=int, nargs="+", default=[50, 100, 200, 500, 1000, 2000]
+    )
+    args = arg_parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for rooms_count in args.rooms:
+            graph, names = synthetic_floor(rooms_count)
+            write_csr_graph(graph, Path(tmp) / "graph.bin")
+            csr = load_csr_graph(Path(tmp) / "graph.bin")
+
+            start = time.perf_counter()
+            build_route_table(csr, names, Path(tmp) / "routes.npz")
+            elapsed = time.perf_counter() - start
+
+            results.append(
+                {
+                    "rooms": rooms_count,
+                    "nodes": len(csr),
+                    "build_seconds": round(elapsed, 4),
+                    "file_bytes": os.path.getsize(Path(tmp) / "routes.npz"),
+                }
+            )
+            print(
+                f"{rooms_count:>6} rooms {len(csr):>7} nodes "
+                f"{elapsed:8.3f} s {results[-1]['file_bytes'] / 1024:10.1f} KiB"
+            )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""Время стадий GraphBuilderSVG на синтетических этажах разного размера
+
+Каждая стадия меряется отдельно на свежем парсере, без обертки вокруг
+методов, поэтому цифры не искажены накладными расходами на замер:
+    parse_svg_file      _parse_svg_file целиком (включает разбор путей и ребра)
+    parse_path_data     _parse_path_data по всем путям graph (включает ребра)
+    add_edge            _add_edge по уже разобранным отрезкам
+    snap                _snap_vertices с допуском SNAP_TOLERANCE
+    snap_diagonals      то же на этаже с DIAGONALS длинными диагоналями через
+                        весь этаж; рядом пишется пик памяти (snap_diagonals_mib)
+    link_rooms          _link_rooms_to_graph
+    export              _export_with_rooms + _convert_to_correct_format
+    merge               merge_correct_jsons по всем этажам
+Для каждой стадии берется минимум по --repeat запускам.
+
+Запуск: python GB/GraphBuilder/benchmarks/bench_svg_parser.py [--json results.json]
+"""
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from svg_parser import (  # noqa: E402
+    GraphBuilderSVG,
+    _SVG_ID_RE,
+    _PATH_D_RE,
+    iter_svg_tags,
+    merge_correct_jsons,
+    parse_path_segments,
+)
+from synthetic_floor import synthetic_floor_svg, write_synthetic_floors  # noqa: E402
+
+SNAP_TOLERANCE = 0.5
+DIAGONALS = 20
+
+
+def _timed(function, *args) -> float:
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def _graph_paths(parser: GraphBuilderSVG):
+    """Сырые теги путей graph вне no_use - то, что попадает в _parse_path_data"""
+    paths = []
+    depth, skip_level = 0, None
+    with open(parser.source_file_path, encoding="utf-8") as f:
+        for tag, raw in iter_svg_tags(f):
+            if tag == "/g":
+                depth -= 1
+                if skip_level is not None and depth < skip_level:
+                    skip_level = None
+                continue
+            id_match = _SVG_ID_RE.search(raw)
+            id = id_match.group(1) if id_match else ""
+            if tag == "g":
+                depth += 1
+                if skip_level is None and parser.no_use_pattern in id:
+                    skip_level = depth
+            elif tag == "path" and skip_level is None and "graph" in id:
+                paths.append(raw)
+    return paths
+
+
+def bench_floor(svg_path: Path) -> dict:
+    """Время стадий одного этажа, секунды"""
+    stages = {}
+
+    parser = GraphBuilderSVG(str(svg_path))
+    stages["parse_svg_file"] = _timed(parser._parse_svg_file)
+    offset = (parser.global_x_offset, parser.global_y_offset)
+
+    raws = _graph_paths(parser)
+    path_parser = GraphBuilderSVG(str(svg_path))
+    path_parser.global_x_offset, path_parser.global_y_offset = offset
+    stages["parse_path_data"] = _timed(
+        lambda: [path_parser._parse_path_data(raw) for raw in raws]
+    )
+
+    segments = []
+    for raw in raws:
+        flat = parse_path_segments(_PATH_D_RE.search(raw).group(1), *offset)
+        segments += [
+            ((flat[j], flat[j + 1]), (flat[j + 2], flat[j + 3]))
+            for j in range(0, len(flat), 4)
+        ]
+    edge_parser = GraphBuilderSVG(str(svg_path))
+
+    def add_edges():
+        for p1, p2 in segments:
+            edge_parser._add_edge(p1, p2)
+
+    stages["add_edge"] = _timed(add_edges)
+
+    snap_parser = GraphBuilderSVG(str(svg_path))
+    snap_parser._parse_svg_file()
+    snap_parser.snap_tolerance = SNAP_TOLERANCE
+    stages["snap"] = _timed(snap_parser._snap_vertices)
+
+    nodes = parser.graph.vertex_count
+    stages["link_rooms"] = _timed(parser._link_rooms_to_graph)
+
+    def export():
+        parser._convert_to_correct_format(parser._export_with_rooms())
+
+    stages["export"] = _timed(export)
+
+    return {
+        "stages": stages,
+        "nodes": nodes,
+        "edges": parser.graph.edge_count,
+        "rooms": len(parser.rooms),
+        "parser": parser,
+    }
+
+
+def bench_snap_diagonals(svg_path: Path) -> Tuple[float, float]:
+    """Время _snap_vertices и пик памяти в МиБ на этаже с диагоналями"""
+    parser = GraphBuilderSVG(str(svg_path))
+    parser._parse_svg_file()
+    parser.snap_tolerance = SNAP_TOLERANCE
+    tracemalloc.start()
+    seconds = _timed(parser._snap_vertices)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak / 2**20
+
+
+def bench_size(folder: Path, segments: int, floors: int, repeat: int) -> dict:
+    paths = write_synthetic_floors(folder / "input_images", segments, floors)
+    diagonal_path = write_synthetic_floors(
+        folder / "diagonals", segments, 1, diagonals=DIAGONALS
+    )[0]
+    _, counts = synthetic_floor_svg(segments)
+
+    best = {}
+    for _ in range(repeat):
+        runs = [bench_floor(path) for path in paths]
+        parsers = [run["parser"] for run in runs]
+        for p in parsers:
+            p.final_folder_path = folder / "final"
+        parsers[0].final_folder_path.mkdir(exist_ok=True)
+        merge_time = _timed(merge_correct_jsons, parsers, folder)
+
+        stages = {
+            name: sum(run["stages"][name] for run in runs) for name in runs[0]["stages"]
+        }
+        stages["merge"] = merge_time
+        stages["snap_diagonals"], peak_mib = bench_snap_diagonals(diagonal_path)
+        for name, seconds in stages.items():
+            best[name] = min(best.get(name, seconds), seconds)
+
+    return {
+        "segments_requested": segments,
+        "segments_per_floor": counts["segments"],
+        "floors": floors,
+        "nodes": sum(run["nodes"] for run in runs),
+        "edges": sum(run["edges"] for run in runs),
+        "rooms": sum(run["rooms"] for run in runs),
+        "svg_bytes": sum(path.stat().st_size for path in paths),
+        "stages": {name: round(seconds, 6) for name, seconds in best.items()},
+        "snap_diagonals_mib": round(peak_mib, 1),
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--json", help="куда записать результаты")
+    arg_parser.add_argument(
+        "--segments", type=int, nargs="+", default=[10, 100, 1000, 10000, 100000]
+    )
+    arg_parser.add_argument("--floors", type=int, default=3)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    results = []
+    for segments in args.segments:
+        with tempfile.TemporaryDirectory() as tmp:
+            result = bench_size(Path(tmp), segments, args.floors, args.repeat)
+        results.append(result)
+        print(
+            f"{segments:>7} segments {result['nodes']:>7} nodes "
+            + " ".join(f"{name} {s:8.4f}" for name, s in result["stages"].items())
+        )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
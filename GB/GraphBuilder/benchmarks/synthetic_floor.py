@@ -0,0 +1,167 @@
+"""Генератор синтетических этажей в том же виде, что экспорт из фигмы
+
+Этаж - решетка коридоров (один path "graph ..."), от узлов решетки отходят
+тупики, у концов которых стоят номера кабинетов (группа room_ids) и лестницы
+(группа staircase). По желанию поверх решетки идут длинные диагонали через
+весь этаж (худший случай для поиска Т-стыков). Всё лежит внутри группы Component со смещением, рядом -
+группа no_use с обводкой кабинетов, которую парсер должен пропустить.
+
+Запуск: python GB/GraphBuilder/benchmarks/synthetic_floor.py OUT_DIR --segments 1000 [--floors 3] [--diagonals 20]
+"""
+
+import argparse
+import random
+from math import ceil, sqrt
+from pathlib import Path
+from typing import List, Tuple
+
+
+# Шаг решетки коридоров и длина тупика к кабинету, в пикселях плана
+GRID_STEP = 50
+SPUR = 25
+# Каждый ROOM_EVERY-й узел решетки получает тупик с кабинетом
+ROOM_EVERY = 4
+STAIRCASES = 2
+COMPONENT_OFFSET = (19, 66)
+
+
+def grid_size(segments: int) -> int:
+    """Сторона квадратной решетки, у которой с тупиками примерно segments отрезков"""
+    # 2k(k - 1) отрезков решетки + k^2 / ROOM_EVERY тупиков
+    return max(2, ceil(sqrt(segments / (2 + 1 / ROOM_EVERY))))
+
+
+def _text(id: str, x: float, y: float, label: str) -> str:
+    return (
+        f'<text id="{id}" transform="translate({x} {y})" fill="black" '
+        f'xml:space="preserve" style="white-space: pre" font-family="Martian Mono" '
+        f'font-size="23.3729" letter-spacing="0em"><tspan x="0" y="28.4535">'
+        f"{label}</tspan></text>"
+    )
+
+
+def synthetic_floor_svg(
+    segments: int,
+    floor: str = "1",
+    korpus: str = "synthetic",
+    seed: int = 0,
+    diagonals: int = 0,
+) -> Tuple[str, dict]:
+    """Текст svg и счетчики: сколько отрезков, кабинетов и лестниц в нем"""
+    rnd = random.Random(seed)
+    k = grid_size(segments)
+    size = k * GRID_STEP
+
+    spurs: List[Tuple[int, int]] = []
+    for row in range(k):
+        for column in range(k):
+            if (row * k + column) % ROOM_EVERY == ROOM_EVERY - 1:
+                spurs.append((column * GRID_STEP, row * GRID_STEP))
+    rnd.shuffle(spurs)
+    staircases, rooms = spurs[:STAIRCASES], spurs[STAIRCASES:]
+
+    commands = []
+    for row in range(k):
+        y = row * GRID_STEP
+        commands.append(f"M0 {y}" + "".join(f"H{c * GRID_STEP}" for c in range(1, k)))
+    for column in range(k):
+        x = column * GRID_STEP
+        commands.append(f"M{x} 0" + "".join(f"V{r * GRID_STEP}" for r in range(1, k)))
+    for x, y in spurs:
+        commands.append(f"M{x} {y}L{x + SPUR} {y + SPUR}")
+    for _ in range(diagonals):
+        # концы не на решетке, чтобы диагональ не шла через её узлы
+        y0, y1 = rnd.uniform(0, size), rnd.uniform(0, size)
+        commands.append(f"M0.5 {y0:.3f}L{size - 0.5} {y1:.3f}")
+
+    lines = [
+        f'<svg width="{size}" height="{size}" viewBox="0 0 {size} {size}" '
+        f'fill="none" xmlns="http://www.w3.org/2000/svg">',
+        f'<g id="floor {floor} {korpus}">',
+        f'<rect width="{size}" height="{size}" fill="white"/>',
+        f'<g id="Component {COMPONENT_OFFSET[0]} {COMPONENT_OFFSET[1]} yes">',
+        '<g id="room_ids">',
+    ]
+    for i, (x, y) in enumerate(rooms):
+        number = f"{floor}{i:05d}"
+        lines.append(_text(number, x + SPUR + 3, y + SPUR + 3, number))
+    lines.append("</g>")
+
+    # Обводка кабинетов: пути без id graph, но с вложенной группой
+    lines.append('<g id="no_use 1">')
+    for i, (x, y) in enumerate(rooms):
+        lines.append(
+            f'<path id="Rectangle {i}" d="M{x + 5} {y + 5}H{x + 45}V{y + 45}H{x + 5}V{y + 5}Z" '
+            f'fill="#75D3FF" fill-opacity="0.52"/>'
+        )
+        if i % 50 == 0:
+            lines.append(f'<g id="Group {i}">')
+            lines.append(
+                f'<path id="graph decoy {i}" d="M{x} {y}H{x + 1000}" stroke="black"/>'
+            )
+            lines.append("</g>")
+    lines.append("</g>")
+
+    lines.append(
+        f'<path id="graph floor {floor}" d="{"".join(commands)}" '
+        f'stroke="#FF0000" stroke-width="3"/>'
+    )
+
+    lines.append('<g id="staircase">')
+    for i, (x, y) in enumerate(staircases, start=1):
+        sx, sy = x + SPUR + 3, y + SPUR + 3
+        lines.append(f'<g id="staircase {floor} {i} group">')
+        lines.append(
+            f'<path id="staircase {floor} {i}" d="M{sx} {sy}H{sx + 10}V{sy + 60}H{sx}V{sy}Z" '
+            f'stroke="black" stroke-width="5"/>'
+        )
+        lines.append("</g>")
+    lines.append("</g>")
+
+    lines += ["</g>", "</g>", "</svg>", ""]
+
+    counts = {
+        "segments": 2 * k * (k - 1) + len(spurs) + diagonals,
+        "rooms": len(rooms),
+        "staircases": len(staircases),
+    }
+    return "\n".join(lines), counts
+
+
+def write_synthetic_floors(
+    folder: Path,
+    segments: int,
+    floors: int = 1,
+    korpus: str = "synthetic",
+    seed: int = 0,
+    diagonals: int = 0,
+) -> List[Path]:
+    """Пишет этажи 1..floors в folder как "floor N korpus.svg" """
+    folder.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for floor in range(1, floors + 1):
+        svg, _ = synthetic_floor_svg(segments, str(floor), korpus, seed + floor, diagonals)
+        path = folder / f"floor {floor} {korpus}.svg"
+        path.write_text(svg, encoding="utf-8")
+        paths.append(path)
+    return paths
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("folder", type=Path)
+    arg_parser.add_argument("--segments", type=int, default=1000)
+    arg_parser.add_argument("--floors", type=int, default=1)
+    arg_parser.add_argument("--korpus", default="synthetic")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--diagonals", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    for path in write_synthetic_floors(
+        args.folder, args.segments, args.floors, args.korpus, args.seed, args.diagonals
+    ):
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Бинарный CSR-формат итогового графа (ans_ans_graph.json -> ans_ans_graph.bin)
+
+Все числа little-endian, каждая секция выровнена на 8 байт от начала файла,
+поэтому файл можно открыть через mmap и смотреть на секции как на массивы
+без разбора.
+
+Заголовок, 64 байта:
+    magic          8 байт  b"MMGRAPH\\0"
+    version        uint32  FORMAT_VERSION
+    n_nodes        uint32  число вершин
+    n_links        uint32  длина массива соседей (каждое ребро записано дважды)
+    n_floors       uint32  число этажей в таблице этажей
+    ids_size       uint32  размер блоба с id вершин в байтах
+    floors_size    uint32  размер блоба с названиями этажей в байтах
+    остаток заголовка заполнен нулями
+
+Секции, в этом порядке:
+    offsets        uint32[n_nodes + 1]   соседи вершины i - neighbours[offsets[i]:offsets[i + 1]]
+    neighbours     uint32[n_links]       индексы вершин-соседей
+    coords         float32[n_nodes, 2]   координаты x, y
+    floor_codes    uint16[n_nodes]       номер этажа вершины в таблице этажей
+    id_offsets     uint32[n_nodes + 1]   границы id вершины i в блобе id
+    ids            utf-8                 id вершин ("1729 215 matmeh_6") подряд
+    floor_offsets  uint32[n_floors + 1]  границы названий этажей в блобе этажей
+    floors         utf-8                 названия этажей ("matmeh_6") подряд
+"""
+
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Dict, List, Union
+
+import numpy as np
+
+
+MAGIC = b"MMGRAPH\0"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8s6I")
+HEADER_SIZE = 64
+ALIGN = 8
+
+
+def _align(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _pack_strings(strings: List[str]):
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype="<u4")
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets, b"".join(encoded)
+
+
+def write_csr_graph(graph: Dict[str, List[str]], path: Union[str, Path]):
+    """Пишет граф вида {"x y korpus_floor": [соседи]} в бинарный CSR"""
+    ids = list(graph.keys())
+    index = {node_id: i for i, node_id in enumerate(ids)}
+
+    offsets = np.zeros(len(ids) + 1, dtype="<u4")
+    np.cumsum([len(graph[node_id]) for node_id in ids], out=offsets[1:])
+    neighbours = np.fromiter(
+        (index[n] for node_id in ids for n in graph[node_id]),
+        dtype="<u4",
+        count=int(offsets[-1]),
+    )
+
+    coords = np.empty((len(ids), 2), dtype="<f4")
+    floor_codes = np.empty(len(ids), dtype="<u2")
+    floors: Dict[str, int] = {}
+    for i, node_id in enumerate(ids):
+        x, y, floor = node_id.split()
+        coords[i] = (float(x), float(y))
+        floor_codes[i] = floors.setdefault(floor, len(floors))
+
+    id_offsets, id_blob = _pack_strings(ids)
+    floor_offsets, floor_blob = _pack_strings(list(floors))
+
+    sections = [
+        offsets.tobytes(),
+        neighbours.tobytes(),
+        coords.tobytes(),
+        floor_codes.tobytes(),
+        id_offsets.tobytes(),
+        id_blob,
+        floor_offsets.tobytes(),
+        floor_blob,
+    ]
+
+    # пишем рядом и подменяем, чтобы читатель не увидел файл наполовину
+    tmp_path = Path(f"{path}.tmp")
+    with open(tmp_path, "wb") as f:
+        header = HEADER.pack(
+            MAGIC,
+            FORMAT_VERSION,
+            len(ids),
+            len(neighbours),
+            len(floors),
+            len(id_blob),
+            len(floor_blob),
+        )
+        f.write(header.ljust(HEADER_SIZE, b"\0"))
+        for section in sections:
+            f.write(section)
+            f.write(b"\0" * (_align(len(section)) - len(section)))
+    os.replace(tmp_path, path)
+
+
+class CSRGraph:
+    """Граф, открытый из бинарного CSR; массивы смотрят прямо в mmap файла"""
+
+    def __init__(self, path: Union[str, Path]):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, n_nodes, n_links, n_floors, ids_size, floors_size = (
+            HEADER.unpack_from(self._mmap)
+        )
+        if magic != MAGIC:
+            raise RuntimeError(f"{path} is not a csr graph")
+        if version != FORMAT_VERSION:
+            raise RuntimeError(f"unsupported csr graph version: {version}")
+
+        pos = HEADER_SIZE
+
+        def section(dtype: str, count: int) -> np.ndarray:
+            nonlocal pos
+            array = np.frombuffer(self._mmap, dtype=dtype, count=count, offset=pos)
+            pos += _align(array.nbytes)
+            return array
+
+        self.offsets = section("<u4", n_nodes + 1)
+        self.neighbours = section("<u4", n_links)
+        self.coords = section("<f4", n_nodes * 2).reshape(n_nodes, 2)
+        self.floor_codes = section("<u2", n_nodes)
+        self._id_offsets = section("<u4", n_nodes + 1)
+        self._ids = section("u1", ids_size)
+        floor_offsets = section("<u4", n_floors + 1)
+        floor_blob = section("u1", floors_size).tobytes()
+        self.floors = [
+            floor_blob[floor_offsets[i] : floor_offsets[i + 1]].decode("utf-8")
+            for i in range(n_floors)
+        ]
+        self._index = None
+
+    def __len__(self) -> int:
+        return len(self.floor_codes)
+
+    def node_id(self, i: int) -> str:
+        start, end = self._id_offsets[i], self._id_offsets[i + 1]
+        return self._ids[start:end].tobytes().decode("utf-8")
+
+    def index_of(self, node_id: str) -> int:
+        """Индекс вершины по её строковому id (словарь строится при первом вызове)"""
+        if self._index is None:
+            self._index = {self.node_id(i): i for i in range(len(self))}
+        return self._index[node_id]
+
+    def neighbours_of(self, i: int) -> np.ndarray:
+        return self.neighbours[self.offsets[i] : self.offsets[i + 1]]
+
+    def to_dict(self) -> Dict[str, List[str]]:
+        """Обратно в формат ans_ans_graph.json"""
+        ids = [self.node_id(i) for i in range(len(self))]
+        return {
+            ids[i]: [ids[n] for n in self.neighbours_of(i)] for i in range(len(self))
+        }
+
+
+def load_csr_graph(path: Union[str, Path]) -> CSRGraph:
+    return CSRGraph(path)
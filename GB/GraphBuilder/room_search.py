@@ -0,0 +1,141 @@
+"""Индекс для поиска кабинетов по имени (ans_ans_names.json -> names_index.json)
+
+Строится при слиянии этажей и лежит рядом с names.json, чтобы клиенту не
+перебирать все имена на каждую букву.
+
+Все ключи нормализованы normalize_name: нижний регистр, ё -> е, латинские
+буквы-двойники -> кириллица ("524a" и "524а" - одно и то же), знаки -> пробел.
+
+Поля json:
+    version    FORMAT_VERSION
+    names      имена кабинетов (ключи names.json), отсортированы по ключу
+    keys       нормализованные имена, в том же порядке
+    prefixes   отсортированные хвосты ключей с начала каждого слова:
+               "деканат матмех" дает "деканат матмех" и "матмех"
+    prefix_ids номер имени для каждого хвоста
+    trigrams   триграмма ключа (с пробелом по краям) -> номера имен по
+               возрастанию
+"""
+
+import bisect
+import json
+import re
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Set, Tuple, Union
+
+import numpy as np
+
+
+FORMAT_VERSION = 1
+
+# латиница, которую путают с кириллицей при наборе номеров вроде 524а
+_HOMOGLYPHS = str.maketrans("aeopcxykmtbh", "аеорсхукмтвн")
+_SEPARATORS_RE = re.compile(r"[\W_]+")
+
+
+def normalize_name(name: str) -> str:
+    name = name.casefold().replace("ё", "е").translate(_HOMOGLYPHS)
+    return " ".join(_SEPARATORS_RE.sub(" ", name).split())
+
+
+def trigrams(key: str) -> Set[str]:
+    padded = f" {key} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def build_search_index(names: Iterable[str]) -> dict:
+    entries = sorted((normalize_name(name), name) for name in set(names))
+    keys = [key for key, _ in entries]
+
+    prefixes = []
+    postings: defaultdict[str, List[int]] = defaultdict(list)
+    for i, key in enumerate(keys):
+        for match in re.finditer(r"\S+", key):
+            prefixes.append((key[match.start() :], i))
+        for trigram in sorted(trigrams(key)):
+            postings[trigram].append(i)
+    prefixes.sort()
+
+    return {
+        "version": FORMAT_VERSION,
+        "names": [name for _, name in entries],
+        "keys": keys,
+        "prefixes": [prefix for prefix, _ in prefixes],
+        "prefix_ids": [i for _, i in prefixes],
+        "trigrams": dict(sorted(postings.items())),
+    }
+
+
+class RoomSearchIndex:
+    def __init__(self, index: dict):
+        if index["version"] != FORMAT_VERSION:
+            raise ValueError(f"неизвестная версия индекса {index['version']}")
+        self.names: List[str] = index["names"]
+        self.keys: List[str] = index["keys"]
+        self.prefixes: List[str] = index["prefixes"]
+        self.prefix_ids: List[int] = index["prefix_ids"]
+        self.postings: Dict[str, np.ndarray] = {
+            trigram: np.array(ids, dtype=np.int32)
+            for trigram, ids in index["trigrams"].items()
+        }
+        # число триграмм у каждого имени - для сходства по Жаккару
+        self.trigram_counts = np.bincount(
+            np.concatenate(list(self.postings.values()) or [np.zeros(0, np.int32)]),
+            minlength=len(self.names),
+        )
+
+    def prefix(self, query: str, limit: int = 10) -> List[str]:
+        """Имена, у которых с query начинается само имя или одно из его слов
+
+        Порядок - по алфавиту совпавшего хвоста.
+        """
+        key = normalize_name(query)
+        if not key:
+            return []
+        found: Dict[int, None] = {}
+        i = bisect.bisect_left(self.prefixes, key)
+        while i < len(self.prefixes) and len(found) < limit:
+            if not self.prefixes[i].startswith(key):
+                break
+            found.setdefault(self.prefix_ids[i])
+            i += 1
+        return [self.names[i] for i in found]
+
+    def fuzzy(
+        self, query: str, limit: int = 10, min_score: float = 0.3
+    ) -> List[Tuple[str, float]]:
+        """Имена с долей общих триграмм с query не ниже min_score
+
+        Доля считается от триграмм запроса, поэтому короткий запрос находит
+        и длинные имена ("деканат" -> "деканат матмех"); при равной доле
+        выше имя, больше похожее целиком.
+        """
+        query_trigrams = trigrams(normalize_name(query))
+        lists = [self.postings[t] for t in query_trigrams if t in self.postings]
+        if not lists:
+            return []
+        ids, shared = np.unique(np.concatenate(lists), return_counts=True)
+        score = shared / len(query_trigrams)
+        keep = score >= min_score
+        ids, shared, score = ids[keep], shared[keep], score[keep]
+        similarity = shared / (len(query_trigrams) + self.trigram_counts[ids] - shared)
+
+        order = np.lexsort((ids, -similarity, -score))[:limit]
+        return [
+            (self.names[i], round(float(s), 3))
+            for i, s in zip(ids[order].tolist(), score[order].tolist())
+        ]
+
+    def search(self, query: str, limit: int = 10) -> List[str]:
+        """Сначала совпадения по началу, потом нечеткие - для автодополнения"""
+        found = dict.fromkeys(self.prefix(query, limit))
+        if len(found) < limit:
+            for name, _ in self.fuzzy(query, limit):
+                found.setdefault(name)
+        return list(found)[:limit]
+
+
+def load_search_index(path: Union[str, Path]) -> RoomSearchIndex:
+    with open(path, encoding="utf-8") as f:
+        return RoomSearchIndex(json.load(f))
@@ -0,0 +1,125 @@
+"""Заранее посчитанные маршруты между всеми кабинетами
+
+Набор кабинетов маленький и не меняется между сборками, поэтому кратчайшие
+пути между всеми парами считаются один раз при сборке (scipy, Дейкстра
+сразу от всех кабинетов), а маршрут потом восстанавливается проходом по
+таблице следующих вершин без поиска.
+
+Файл - обычный .npz:
+    rooms       названия кабинетов (ключи ans_ans_names.json)
+    room_node   индекс вершины кабинета в CSR-графе
+    room_row    строка кабинета в next_hop (у кабинетов с общей вершиной общая строка)
+    dist        float32[rooms, rooms] длина кратчайшего пути, inf - пути нет
+    next_hop    int32[targets, nodes] next_hop[room_row[b], v] - следующая вершина
+                на пути из v к кабинету b, -1 - пути нет
+"""
+
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+from graph_csr import CSRGraph
+
+
+# Цена перехода по лестнице/лифту между этажами, в пикселях плана
+FLOOR_CHANGE_COST = 100.0
+
+
+def weighted_adjacency(
+    graph: CSRGraph, edge_lengths: Optional[Dict[Tuple[str, str], float]] = None
+) -> csr_matrix:
+    """Разреженная матрица смежности с длинами ребер
+
+    Внутри этажа вес - евклидово расстояние, между этажами - FLOOR_CHANGE_COST.
+    edge_lengths задает длины ребер явно (схлопнутые коридоры, у которых
+    длина ломаной больше расстояния между концами).
+    Повторяющиеся соседи схлопываются в одно ребро.
+    """
+    n = len(graph)
+    offsets = graph.offsets.astype(np.int64)
+    rows = np.repeat(np.arange(n), np.diff(offsets))
+    cols = graph.neighbours.astype(np.int64)
+
+    _, first = np.unique(rows * n + cols, return_index=True)
+    rows, cols = rows[first], cols[first]
+
+    weights = np.hypot(*(graph.coords[rows] - graph.coords[cols]).T).astype(np.float64)
+    weights[graph.floor_codes[rows] != graph.floor_codes[cols]] = FLOOR_CHANGE_COST
+
+    if edge_lengths:
+        position = {(r, c): i for i, (r, c) in enumerate(zip(rows.tolist(), cols.tolist()))}
+        for (a, b), length in edge_lengths.items():
+            i, j = graph.index_of(a), graph.index_of(b)
+            for key in ((i, j), (j, i)):
+                if key in position:
+                    weights[position[key]] = length
+    return csr_matrix((weights, (rows, cols)), shape=(n, n))
+
+
+def write_npz(output_path: Union[str, Path], **arrays: np.ndarray):
+    """Пишет сжатый .npz во временный файл рядом и подменяет им output_path"""
+    # savez сам дописывает .npz, поэтому временный файл тоже с .npz
+    tmp_path = Path(output_path).with_suffix(".tmp.npz")
+    np.savez_compressed(tmp_path, **arrays)
+    os.replace(tmp_path, output_path)
+
+
+def build_route_table(
+    graph: CSRGraph,
+    names: Dict[str, str],
+    output_path: Union[str, Path],
+    edge_lengths: Optional[Dict[Tuple[str, str], float]] = None,
+):
+    """Считает расстояния и следующие вершины для всех пар кабинетов"""
+    rooms = list(names.keys())
+    room_node = np.array([graph.index_of(names[room]) for room in rooms], dtype=np.int32)
+    targets, room_row = np.unique(room_node, return_inverse=True)
+
+    # граф неориентированный, поэтому предок v в дереве от цели b -
+    # это следующая вершина на пути из v в b
+    dist, predecessors = dijkstra(
+        weighted_adjacency(graph, edge_lengths), indices=targets, return_predecessors=True
+    )
+    next_hop = np.where(predecessors < 0, -1, predecessors).astype(np.int32)
+    room_dist = dist[room_row][:, room_node].astype(np.float32)
+
+    write_npz(
+        output_path,
+        rooms=np.array(rooms),
+        room_node=room_node,
+        room_row=room_row.astype(np.int32),
+        dist=room_dist,
+        next_hop=next_hop,
+    )
+
+
+class RouteTable:
+    def __init__(self, path: Union[str, Path]):
+        with np.load(path) as data:
+            self.rooms: List[str] = data["rooms"].tolist()
+            self.room_node = data["room_node"]
+            self.room_row = data["room_row"]
+            self.dist = data["dist"]
+            self.next_hop = data["next_hop"]
+        self._room_index = {room: i for i, room in enumerate(self.rooms)}
+
+    def distance(self, start: str, end: str) -> float:
+        return float(self.dist[self._room_index[start], self._room_index[end]])
+
+    def route(self, start: str, end: str) -> List[int]:
+        """Вершины CSR-графа от кабинета start до end; пустой список, если пути нет"""
+        a, b = self._room_index[start], self._room_index[end]
+        node, target = int(self.room_node[a]), int(self.room_node[b])
+        hops = self.next_hop[self.room_row[b]]
+
+        path = [node]
+        while node != target:
+            node = int(hops[node])
+            if node < 0:
+                return []
+            path.append(node)
+        return path
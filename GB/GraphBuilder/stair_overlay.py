@@ -0,0 +1,221 @@
+"""Двухуровневый граф для маршрутов между этажами: этажи + лестницы и лифты
+
+Этажи связаны только через вершины лестниц и лифтов (порталы - вершины, у
+которых есть сосед на другом этаже). Для каждого этажа при сборке считаются
+таблицы расстояний внутри этажа: портал - портал, кабинет - портал и
+кабинет - кабинет. Порталы с ребрами "портал - портал" этажа и ребрами между
+этажами образуют маленький граф-надстройку, поэтому маршрут между этажами -
+это поиск по надстройке и два взгляда в таблицы кабинет - портал, без
+прохода по всему графу здания. Веса ребер те же, что в route_table.
+
+Файл - обычный .npz:
+    rooms                 названия кабинетов (ключи ans_ans_names.json)
+    room_node             индекс вершины кабинета в CSR-графе
+    room_floor            номер этажа кабинета (floor_codes CSR-графа)
+    room_slot             номер кабинета среди кабинетов его этажа
+    portals               индексы вершин-порталов в CSR-графе, по этажам
+    floor_portal_offsets  порталы этажа f - portals[offsets[f]:offsets[f + 1]]
+    floor_room_counts     число кабинетов на этаже
+    floor_room_offsets    начало таблицы кабинет - кабинет этажа в room_room_dist
+    room_room_dist        float32, для этажа f - матрица [кабинеты f, кабинеты f]
+    room_portal_offsets   начало строки кабинета в room_portal_dist
+    room_portal_dist      float32, для кабинета - расстояния до порталов его этажа
+    overlay_offsets       CSR надстройки: соседи портала i (номер в portals) -
+    overlay_targets           overlay_targets[overlay_offsets[i]:overlay_offsets[i + 1]]
+    overlay_weights       длины ребер надстройки
+Расстояние inf - пути нет.
+"""
+
+import heapq
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+from graph_csr import CSRGraph
+from route_table import weighted_adjacency, write_npz
+
+
+def build_stair_overlay(
+    graph: CSRGraph,
+    names: Dict[str, str],
+    output_path: Union[str, Path],
+    edge_lengths: Optional[Dict[Tuple[str, str], float]] = None,
+):
+    """Считает таблицы этажей и граф-надстройку из порталов"""
+    n = len(graph)
+    n_floors = len(graph.floors)
+    floor_codes = graph.floor_codes.astype(np.int64)
+
+    adjacency = weighted_adjacency(graph, edge_lengths).tocoo()
+    rows, cols, weights = adjacency.row, adjacency.col, adjacency.data
+    cross = floor_codes[rows] != floor_codes[cols]
+    inside = csr_matrix(
+        (weights[~cross], (rows[~cross], cols[~cross])), shape=(n, n)
+    )
+
+    portals = np.unique(rows[cross])
+    portals = portals[np.argsort(floor_codes[portals], kind="stable")]
+    floor_portal_offsets = np.zeros(n_floors + 1, np.int64)
+    np.cumsum(np.bincount(floor_codes[portals], minlength=n_floors), out=floor_portal_offsets[1:])
+    portal_index = np.full(n, -1, np.int64)
+    portal_index[portals] = np.arange(len(portals))
+
+    rooms = list(names.keys())
+    room_node = np.array([graph.index_of(names[room]) for room in rooms], dtype=np.int64)
+    room_floor = floor_codes[room_node]
+    room_slot = np.zeros(len(rooms), np.int64)
+    floor_room_counts = np.bincount(room_floor, minlength=n_floors)
+    for f in range(n_floors):
+        on_floor = np.flatnonzero(room_floor == f)
+        room_slot[on_floor] = np.arange(len(on_floor))
+
+    floor_room_offsets = np.zeros(n_floors + 1, np.int64)
+    np.cumsum(floor_room_counts**2, out=floor_room_offsets[1:])
+    room_room_dist = np.full(floor_room_offsets[-1], np.inf, np.float32)
+    room_portal_counts = np.diff(floor_portal_offsets)[room_floor]
+    room_portal_offsets = np.zeros(len(rooms) + 1, np.int64)
+    np.cumsum(room_portal_counts, out=room_portal_offsets[1:])
+    room_portal_dist = np.full(room_portal_offsets[-1], np.inf, np.float32)
+
+    overlay_rows = [portal_index[rows[cross]]]
+    overlay_cols = [portal_index[cols[cross]]]
+    overlay_weights = [weights[cross]]
+
+    for f in range(n_floors):
+        nodes = np.flatnonzero(floor_codes == f)
+        local = np.full(n, -1, np.int64)
+        local[nodes] = np.arange(len(nodes))
+        floor_graph = inside[nodes][:, nodes]
+        floor_portals = portals[floor_portal_offsets[f] : floor_portal_offsets[f + 1]]
+        floor_rooms = np.flatnonzero(room_floor == f)
+
+        if len(floor_rooms):
+            dist = dijkstra(floor_graph, indices=local[room_node[floor_rooms]])
+            block = dist[:, local[room_node[floor_rooms]]]
+            room_room_dist[floor_room_offsets[f] : floor_room_offsets[f + 1]] = block.ravel()
+            if len(floor_portals):
+                to_portals = dist[:, local[floor_portals]]
+                for i, room in enumerate(floor_rooms.tolist()):
+                    start = room_portal_offsets[room]
+                    room_portal_dist[start : start + len(floor_portals)] = to_portals[i]
+
+        if len(floor_portals) > 1:
+            dist = dijkstra(floor_graph, indices=local[floor_portals])[:, local[floor_portals]]
+            a, b = np.nonzero(np.isfinite(dist) & ~np.eye(len(floor_portals), dtype=bool))
+            overlay_rows.append(portal_index[floor_portals[a]])
+            overlay_cols.append(portal_index[floor_portals[b]])
+            overlay_weights.append(dist[a, b])
+
+    overlay = csr_matrix(
+        (
+            np.concatenate(overlay_weights),
+            (np.concatenate(overlay_rows), np.concatenate(overlay_cols)),
+        ),
+        shape=(len(portals), len(portals)),
+    )
+
+    write_npz(
+        output_path,
+        rooms=np.array(rooms),
+        room_node=room_node.astype(np.int32),
+        room_floor=room_floor.astype(np.int32),
+        room_slot=room_slot.astype(np.int32),
+        portals=portals.astype(np.int32),
+        floor_portal_offsets=floor_portal_offsets,
+        floor_room_counts=floor_room_counts.astype(np.int32),
+        floor_room_offsets=floor_room_offsets,
+        room_room_dist=room_room_dist,
+        room_portal_offsets=room_portal_offsets,
+        room_portal_dist=room_portal_dist,
+        overlay_offsets=overlay.indptr.astype(np.int64),
+        overlay_targets=overlay.indices.astype(np.int32),
+        overlay_weights=overlay.data.astype(np.float32),
+    )
+
+
+class StairOverlay:
+    def __init__(self, path: Union[str, Path]):
+        with np.load(path) as data:
+            self.rooms: List[str] = data["rooms"].tolist()
+            self.room_node = data["room_node"]
+            self.room_floor = data["room_floor"].tolist()
+            self.room_slot = data["room_slot"].tolist()
+            self.portals = data["portals"]
+            self.floor_portal_offsets = data["floor_portal_offsets"].tolist()
+            self.floor_room_counts = data["floor_room_counts"].tolist()
+            self.floor_room_offsets = data["floor_room_offsets"].tolist()
+            self.room_room_dist = data["room_room_dist"]
+            self.room_portal_offsets = data["room_portal_offsets"].tolist()
+            self.room_portal_dist = data["room_portal_dist"]
+            self.overlay_offsets = data["overlay_offsets"].tolist()
+            self.overlay_targets = data["overlay_targets"].tolist()
+            self.overlay_weights = data["overlay_weights"].tolist()
+        self._room_index = {room: i for i, room in enumerate(self.rooms)}
+
+    def _to_portals(self, room: int) -> List[float]:
+        """Расстояния от кабинета до порталов его этажа, по порядку portals"""
+        start = self.room_portal_offsets[room]
+        return self.room_portal_dist[start : self.room_portal_offsets[room + 1]].tolist()
+
+    def query(self, start: str, end: str) -> Tuple[float, List[int]]:
+        """Длина кратчайшего пути и порталы на нем (индексы вершин CSR-графа)
+
+        Внутри этажа - взгляд в таблицу кабинет - кабинет; между этажами (и
+        через другой этаж, если так короче) - Дейкстра по надстройке от
+        порталов этажа start до порталов этажа end.
+        """
+        a, b = self._room_index[start], self._room_index[end]
+        floor_a, floor_b = self.room_floor[a], self.room_floor[b]
+
+        best, best_portal = float("inf"), -1
+        if floor_a == floor_b:
+            count = self.floor_room_counts[floor_a]
+            best = float(
+                self.room_room_dist[
+                    self.floor_room_offsets[floor_a]
+                    + self.room_slot[a] * count
+                    + self.room_slot[b]
+                ]
+            )
+
+        first_a = self.floor_portal_offsets[floor_a]
+        first_b = self.floor_portal_offsets[floor_b]
+        last_b = self.floor_portal_offsets[floor_b + 1]
+        exit_cost = self._to_portals(b)
+
+        dist: Dict[int, float] = {}
+        previous: Dict[int, int] = {}
+        heap = []
+        for i, d in enumerate(self._to_portals(a)):
+            if d < float("inf"):
+                dist[first_a + i] = d
+                previous[first_a + i] = -1
+                heap.append((d, first_a + i))
+        heapq.heapify(heap)
+
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d >= best:
+                break
+            if d > dist[u]:
+                continue
+            if first_b <= u < last_b and d + exit_cost[u - first_b] < best:
+                best, best_portal = d + exit_cost[u - first_b], u
+            for k in range(self.overlay_offsets[u], self.overlay_offsets[u + 1]):
+                v, nd = self.overlay_targets[k], d + self.overlay_weights[k]
+                if nd < dist.get(v, float("inf")):
+                    dist[v] = nd
+                    previous[v] = u
+                    heapq.heappush(heap, (nd, v))
+
+        route = []
+        while best_portal >= 0:
+            route.append(int(self.portals[best_portal]))
+            best_portal = previous[best_portal]
+        return best, route[::-1]
+
+    def distance(self, start: str, end: str) -> float:
+        return self.query(start, end)[0]
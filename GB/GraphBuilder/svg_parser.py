@@ -1,5 +1,12 @@
 import re
 import json
+import glob
+import gzip
+import hashlib
+import argparse
+import time
+import tracemalloc
+from array import array
 from pathlib import Path
 from typing import NamedTuple
 
@@ -7,11 +14,24 @@ from typing import NamedTuple
 
 # import xml.etree.ElementTree as ET
 from collections import defaultdict
-from math import sqrt, isclose
+from concurrent.futures import ProcessPoolExecutor
+from math import sqrt, isclose, floor, ceil
 from dataclasses import dataclass
 from typing import Dict, Set, Tuple, List, Optional
 import os
 
+import numpy as np
+
+try:
+    import brotli
+except ImportError:  # без brotli рядом с json кладется только .gz
+    brotli = None
+
+from graph_csr import load_csr_graph, write_csr_graph
+from room_search import build_search_index
+from route_table import build_route_table
+from stair_overlay import build_stair_overlay
+
 
 FINAL_GRAPH_JSON_PATH = ""
 
@@ -29,19 +49,509 @@ class RoomInfo:
     number: str
     x: float
     y: float
-    node_id: Optional[str] = None
 
 offset_dict: Dict[str, Tuple[float,float]] = {}
 
+# Начало тега и его имя ("g", "/g", "path", ...)
+_SVG_TAG_START_RE = re.compile(r"<(/?[^\s/>!?]+)")
+_SVG_ID_RE = re.compile(r'\sid="([^"]*)"')
+
+
+def iter_svg_tags(file, chunk_size: int = 1 << 16):
+    """Потоково читает svg и отдает пары (имя тега, текст тега)
+
+    Закрывающие теги отдаются как "/g", "/text" и т.д. Тег может быть
+    растянут на несколько строк, а ">" внутри значения в кавычках не
+    считается концом тега. В памяти держится только текущий кусок файла
+    и недочитанный хвост последнего тега.
+    """
+    search = _SVG_TAG_START_RE.search
+    buffer = ""
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            return
+        buffer = buffer + chunk if buffer else chunk
+        find, count = buffer.find, buffer.count
+        pos = 0
+        while True:
+            tag_match = search(buffer, pos)
+            if tag_match is None:
+                # кусок мог оборваться сразу после "<"
+                pos = max(pos, buffer.rfind("<"))
+                if buffer[pos:pos + 1] != "<":
+                    pos = len(buffer)
+                break
+            start = tag_match.start()
+            end = find(">", start)
+            # нечетное число кавычек - ">" оказался внутри значения атрибута
+            while end != -1 and count('"', start, end) % 2:
+                end = find(">", end + 1)
+            if end == -1:
+                # тег не дочитан, оставляем его на следующий кусок
+                pos = start
+                break
+            pos = end + 1
+            yield tag_match.group(1), buffer[start:pos]
+        buffer = buffer[pos:]
+
+
+_PATH_D_RE = re.compile(r'\sd="([^"]*)"')
+_PATH_COMMAND_RE = re.compile(r"([MmLlHhVvZzCcSsQqTtAa])([^MmLlHhVvZzCcSsQqTtAa]*)")
+# 1, -2.5, .5, 1e-3; знак или вторая точка начинают новое число: "10-5", ".5.5"
+_PATH_NUMBER_RE = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+# у дуги флаги могут быть записаны слитно: "a10 10 0 015 5"
+_PATH_ARC_RE = re.compile(
+    r"({0})[\s,]*({0})[\s,]*({0})[\s,]*([01])[\s,]*([01])[\s,]*({0})[\s,]*({0})".format(
+        _PATH_NUMBER_RE.pattern
+    )
+)
+# сколько чисел в одном сегменте команды; конечная точка - последние два
+_PATH_ARGS_COUNT = {"M": 2, "L": 2, "T": 2, "H": 1, "V": 1, "S": 4, "Q": 4, "C": 6, "A": 7}
+
+
+def parse_path_segments(
+    path_data: str, x_offset: float = 0.0, y_offset: float = 0.0
+) -> array:
+    """Разбирает d= пути в плоский массив отрезков [x1, y1, x2, y2, ...]
+
+    Поддерживаются все команды SVG, в том числе относительные. Кривые (C/S/Q/T/A)
+    заменяются отрезком до своей конечной точки. Смещение прибавляется
+    к абсолютным координатам; курсор стартует из смещения, поэтому путь,
+    начатый относительным m, тоже сдвигается.
+    """
+    segments = array("d")
+    x, y = x_offset, y_offset
+    start_x, start_y = x, y
+
+    for command, args in _PATH_COMMAND_RE.findall(path_data):
+        upper = command.upper()
+        if upper == "Z":
+            if (x, y) != (start_x, start_y):
+                segments.extend((x, y, start_x, start_y))
+            x, y = start_x, start_y
+            continue
+
+        relative = command != upper
+        if upper == "A":
+            numbers = [float(n) for arc in _PATH_ARC_RE.findall(args) for n in arc]
+        else:
+            numbers = [float(n) for n in _PATH_NUMBER_RE.findall(args)]
+        step = _PATH_ARGS_COUNT[upper]
+
+        for j in range(0, len(numbers) - step + 1, step):
+            if upper == "H":
+                new_x = x + numbers[j] if relative else numbers[j] + x_offset
+                new_y = y
+            elif upper == "V":
+                new_x = x
+                new_y = y + numbers[j] if relative else numbers[j] + y_offset
+            elif relative:
+                new_x, new_y = x + numbers[j + step - 2], y + numbers[j + step - 1]
+            else:
+                new_x = numbers[j + step - 2] + x_offset
+                new_y = numbers[j + step - 1] + y_offset
+
+            if upper == "M" and j == 0:
+                # следующие пары после M - это неявные L
+                start_x, start_y = new_x, new_y
+            else:
+                segments.extend((x, y, new_x, new_y))
+            x, y = new_x, new_y
+
+    return segments
+
+
+class SpatialGrid:
+    """Равномерная сетка для поиска ближайших вершин графа
+
+    Вершины отсортированы по ячейкам, ячейка - отрезок этого порядка.
+    Удаленная вершина только помечается неактивной.
+    """
+
+    def __init__(self, cell_size: float, xs: np.ndarray, ys: np.ndarray, nodes: np.ndarray):
+        self.cell_size = cell_size
+        # поиск идет по одной вершине, из списков это быстрее, чем из numpy
+        self.xs, self.ys = xs.tolist(), ys.tolist()
+        cx = np.floor(xs[nodes] / cell_size).astype(np.int64)
+        cy = np.floor(ys[nodes] / cell_size).astype(np.int64)
+        order = np.lexsort((nodes, cy, cx))
+        self.nodes: List[int] = nodes[order].tolist()
+        cx, cy = cx[order], cy[order]
+
+        change = np.ones(len(order), bool)
+        change[1:] = (cx[1:] != cx[:-1]) | (cy[1:] != cy[:-1])
+        starts = np.flatnonzero(change)
+        ends = np.r_[starts[1:], len(order)]
+        self.cells: Dict[Tuple[int, int], Tuple[int, int]] = {
+            (i, j): (start, end)
+            for i, j, start, end in zip(
+                cx[starts].tolist(), cy[starts].tolist(), starts.tolist(), ends.tolist()
+            )
+        }
+        self.active = bytearray(len(xs))
+        np.frombuffer(self.active, dtype=np.uint8)[nodes] = 1
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return floor(x / self.cell_size), floor(y / self.cell_size)
+
+    def remove(self, node: int):
+        self.active[node] = 0
+
+    def nearest(self, x: float, y: float, max_distance: float) -> Optional[int]:
+        """Ближайшая вершина на расстоянии строго меньше max_distance
+
+        При равных расстояниях выбирается вершина с меньшим номером, то есть
+        та, что раньше встретилась в svg.
+        """
+        cx, cy = self._cell(x, y)
+        radius = max(1, ceil(max_distance / self.cell_size))
+
+        xs, ys, active = self.xs, self.ys, self.active
+
+        closest_node = None
+        best = max_distance
+        for i in range(cx - radius, cx + radius + 1):
+            for j in range(cy - radius, cy + radius + 1):
+                span = self.cells.get((i, j))
+                if span is None:
+                    continue
+                for node in self.nodes[span[0] : span[1]]:
+                    if not active[node]:
+                        continue
+                    distance = sqrt((x - xs[node]) ** 2 + (y - ys[node]) ** 2)
+                    if distance < best or (
+                        distance == best and closest_node is not None and node < closest_node
+                    ):
+                        best = distance
+                        closest_node = node
+        return closest_node
+
+
+# Длина куска ребра при поиске Т-стыков, в ячейках сетки
+PIECE_CELLS = 4
+
+
+def _cell_keys(cx: np.ndarray, cy: np.ndarray) -> np.ndarray:
+    """Одно int64 на ячейку сетки (номера ячеек по модулю меньше 2**31)"""
+    return (cx.astype(np.int64) << 32) + (cy.astype(np.int64) & 0xFFFFFFFF)
+
+
+def _matching_pairs(keys_a: np.ndarray, keys_b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Все пары (i, j) с keys_a[i] == keys_b[j] - соединение по ключу без цикла"""
+    order = np.argsort(keys_b, kind="stable")
+    sorted_b = keys_b[order]
+    lo = np.searchsorted(sorted_b, keys_a, "left")
+    counts = np.searchsorted(sorted_b, keys_a, "right") - lo
+    i = np.repeat(np.arange(len(keys_a)), counts)
+    shift = np.repeat(lo - (np.cumsum(counts) - counts), counts)
+    return i, order[np.arange(len(i)) + shift]
+
+
+class FloorGraph:
+    """Граф этажа в плоских массивах с одной схемой на все стадии
+
+    Вершина - номер точки в порядке первого появления в svg. Координаты и
+    флаги вершин лежат в параллельных массивах, ребро - пара номеров в
+    edge_from/edge_to, кабинет - номер вершины в room_vertex. Удаление
+    только помечает вершину или ребро, номера не сдвигаются. Массивы растут
+    как array и отдаются в numpy без копирования (np.frombuffer).
+
+    Точки добавляются только при разборе svg; freeze() его завершает, после
+    него работают удаление, счетчики и выборки живых вершин и ребер.
+    """
+
+    def __init__(self):
+        # точка -> номер вершины; нужен только при разборе, freeze() его убирает
+        self.ids: Optional[Dict[Tuple[float, float], int]] = {}
+        self.x = array("d")
+        self.y = array("d")
+        # флаги вершин заводятся в freeze(), до него вершины не удаляются
+        self.removed = bytearray()
+        self.has_room = bytearray()
+
+        self.edge_from = array("i")
+        self.edge_to = array("i")
+        self.edge_removed = bytearray()
+
+        # номер кабинета в GraphBuilderSVG.rooms -> вершина или -1
+        self.room_vertex = np.zeros(0, np.int32)
+
+        self.vertex_count = 0
+        self.edge_count = 0
+
+    def vertex(self, point: Tuple[float, float]) -> int:
+        """Номер вершины точки; новая точка становится вершиной"""
+        if self.ids is None:
+            raise RuntimeError("граф уже собран, новые точки не добавляются")
+        v = self.ids.get(point)
+        if v is None:
+            v = self.ids[point] = len(self.x)
+            self.x.append(point[0])
+            self.y.append(point[1])
+        return v
+
+    def point(self, v: int) -> Tuple[float, float]:
+        return self.x[v], self.y[v]
+
+    def add_edge(self, a: int, b: int):
+        self.edge_from.append(a)
+        self.edge_to.append(b)
+        self.edge_removed.append(0)
+        self.edge_count += 1
+
+    def freeze(self):
+        """Разбор закончен: повторы ребер помечаются удаленными, индекс точек уходит
+
+        Повтором считается только ребро с теми же концами в том же порядке,
+        (a, b) и (b, a) - разные ребра.
+        """
+        a = np.frombuffer(self.edge_from, dtype=np.int32).astype(np.int64)
+        b = np.frombuffer(self.edge_to, dtype=np.int32)
+        self._drop_repeated_edges((a << 32) | b)
+        self.ids = None
+
+        self.vertex_count = len(self.x)
+        self.removed = bytearray(len(self.x))
+        self.has_room = bytearray(len(self.x))
+
+    def _drop_repeated_edges(self, keys: np.ndarray):
+        """Из живых ребер с одинаковым ключом остается первое"""
+        removed = np.frombuffer(self.edge_removed, dtype=np.uint8)
+        alive = np.flatnonzero(removed == 0)
+        _, first = np.unique(keys[alive], return_index=True)
+        repeated = np.ones(len(alive), bool)
+        repeated[first] = False
+        removed[alive[repeated]] = 1
+        self.edge_count = len(first)
+
+    def _drop_repeated_undirected(self):
+        a = np.frombuffer(self.edge_from, dtype=np.int32).astype(np.int64)
+        b = np.frombuffer(self.edge_to, dtype=np.int32).astype(np.int64)
+        self._drop_repeated_edges((np.minimum(a, b) << 32) | np.maximum(a, b))
+
+    def snap(self, tolerance: float) -> Tuple[int, int]:
+        """Сливает вершины, лежащие ближе tolerance
+
+        Сетка с ячейкой tolerance: близкие вершины лежат в соседних ячейках,
+        пары ищутся соединением по ключу ячейки, так что время почти
+        линейное. Вершина сливается с самой ранней ещё не слитой соседкой.
+        Ребра, ставшие петлями, и повторы (в любую сторону) удаляются.
+        Возвращает (слито вершин, пропало ребер).
+        """
+        vertices = self.vertices()
+        xs, ys = self.coords()
+        x, y = xs[vertices], ys[vertices]
+        cx = np.floor(x / tolerance).astype(np.int64)
+        cy = np.floor(y / tolerance).astype(np.int64)
+        keys = _cell_keys(cx, cy)
+
+        pairs_u, pairs_v = [], []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                i, j = _matching_pairs(_cell_keys(cx + dx, cy + dy), keys)
+                close = (i < j) & (np.hypot(x[i] - x[j], y[i] - y[j]) <= tolerance)
+                pairs_u.append(vertices[i[close]])
+                pairs_v.append(vertices[j[close]])
+        u, v = np.concatenate(pairs_u), np.concatenate(pairs_v)
+        order = np.lexsort((v, u))
+
+        leader = np.arange(len(xs), dtype=np.int32)
+        for a, b in zip(u[order].tolist(), v[order].tolist()):
+            if leader[a] == a and leader[b] == b:
+                leader[b] = a
+        merged = np.flatnonzero(leader != np.arange(len(xs)))
+        if len(merged) == 0:
+            return 0, 0
+
+        for w in merged.tolist():
+            self.remove_vertex(w)
+        edges_before = self.edge_count
+        edge_from = np.frombuffer(self.edge_from, dtype=np.int32)
+        edge_to = np.frombuffer(self.edge_to, dtype=np.int32)
+        edge_from[:] = leader[edge_from]
+        edge_to[:] = leader[edge_to]
+        np.frombuffer(self.edge_removed, dtype=np.uint8)[edge_from == edge_to] = 1
+        self._drop_repeated_undirected()
+        return len(merged), edges_before - self.edge_count
+
+    def split_t_junctions(self, tolerance: float) -> int:
+        """Разрезает ребра, на которых (с точностью tolerance) лежит чужая вершина
+
+        Ребро режется во всех таких вершинах по порядку вдоль него. Пары
+        ребро-вершина ищутся по сетке с ячейкой не меньше медианной длины
+        ребра. Ребро длиннее PIECE_CELLS ячеек сначала режется на куски не
+        длиннее этого, и каждый кусок попадает в ячейки своей рамки - так
+        диагональ дает ячеек пропорционально длине, а не площади рамки.
+        Вершина попадает в одну ячейку.
+        Возвращает число точек разреза.
+        """
+        edges = self.live_edges()
+        if len(edges) == 0:
+            return 0
+        vertices = self.vertices()
+        xs, ys = self.coords()
+        a = np.frombuffer(self.edge_from, dtype=np.int32)[edges]
+        b = np.frombuffer(self.edge_to, dtype=np.int32)[edges]
+        ax, ay, bx, by = xs[a], ys[a], xs[b], ys[b]
+        length = np.hypot(bx - ax, by - ay)
+        cell = max(tolerance, float(np.median(length)))
+
+        pieces = np.maximum(np.ceil(length / (PIECE_CELLS * cell)), 1).astype(np.int64)
+        e = np.repeat(np.arange(len(edges)), pieces)
+        k = np.arange(len(e)) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+        t0, t1 = k / pieces[e], (k + 1) / pieces[e]
+        px0, px1 = ax[e] + t0 * (bx - ax)[e], ax[e] + t1 * (bx - ax)[e]
+        py0, py1 = ay[e] + t0 * (by - ay)[e], ay[e] + t1 * (by - ay)[e]
+
+        x0 = np.floor((np.minimum(px0, px1) - tolerance) / cell).astype(np.int64)
+        x1 = np.floor((np.maximum(px0, px1) + tolerance) / cell).astype(np.int64)
+        y0 = np.floor((np.minimum(py0, py1) - tolerance) / cell).astype(np.int64)
+        y1 = np.floor((np.maximum(py0, py1) + tolerance) / cell).astype(np.int64)
+        height = y1 - y0 + 1
+        counts = (x1 - x0 + 1) * height
+        piece = np.repeat(np.arange(len(e)), counts)
+        k = np.arange(len(piece)) - np.repeat(np.cumsum(counts) - counts, counts)
+        e = e[piece]
+        edge_cells = _cell_keys(x0[piece] + k // height[piece], y0[piece] + k % height[piece])
+        if pieces.max() > 1:
+            # соседние куски ребра делят ячейки, пара ребро-ячейка нужна одна
+            order = np.lexsort((edge_cells, e))
+            e, edge_cells = e[order], edge_cells[order]
+            first = np.ones(len(e), bool)
+            first[1:] = (e[1:] != e[:-1]) | (edge_cells[1:] != edge_cells[:-1])
+            e, edge_cells = e[first], edge_cells[first]
+        vertex_cells = _cell_keys(
+            np.floor(xs[vertices] / cell).astype(np.int64),
+            np.floor(ys[vertices] / cell).astype(np.int64),
+        )
+
+        i, j = _matching_pairs(edge_cells, vertex_cells)
+        e, p = e[i], vertices[j]
+        keep = (p != a[e]) & (p != b[e])
+        e, p = e[keep], p[keep]
+        dx, dy = bx[e] - ax[e], by[e] - ay[e]
+        t = ((xs[p] - ax[e]) * dx + (ys[p] - ay[e]) * dy) / (dx * dx + dy * dy)
+        distance = np.hypot(ax[e] + t * dx - xs[p], ay[e] + t * dy - ys[p])
+        on_edge = (t > 0) & (t < 1) & (distance <= tolerance)
+        e, p, t = e[on_edge], p[on_edge], t[on_edge]
+        if len(e) == 0:
+            return 0
+
+        order = np.lexsort((p, t, e))
+        cuts: Dict[int, List[int]] = defaultdict(list)
+        for edge, point in zip(e[order].tolist(), p[order].tolist()):
+            cuts[edge].append(point)
+        for edge, points in cuts.items():
+            chain = [int(a[edge])] + points + [int(b[edge])]
+            self.remove_edge(int(edges[edge]))
+            for q, r in zip(chain, chain[1:]):
+                self.add_edge(q, r)
+        self._drop_repeated_undirected()
+        return len(e)
+
+    def other_end(self, e: int, v: int) -> int:
+        return self.edge_to[e] if self.edge_from[e] == v else self.edge_from[e]
+
+    def remove_edge(self, e: int):
+        if not self.edge_removed[e]:
+            self.edge_removed[e] = 1
+            self.edge_count -= 1
+
+    def remove_vertex(self, v: int):
+        if not self.removed[v]:
+            self.removed[v] = 1
+            self.vertex_count -= 1
+
+    def coords(self) -> Tuple[np.ndarray, np.ndarray]:
+        return (
+            np.frombuffer(self.x, dtype=np.float64),
+            np.frombuffer(self.y, dtype=np.float64),
+        )
+
+    def vertices(self) -> np.ndarray:
+        """Номера живых вершин по возрастанию"""
+        return np.flatnonzero(np.frombuffer(self.removed, dtype=np.uint8) == 0)
+
+    def live_edges(self) -> np.ndarray:
+        """Номера живых ребер в порядке добавления"""
+        return np.flatnonzero(np.frombuffer(self.edge_removed, dtype=np.uint8) == 0)
+
+    def edges(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Концы живых ребер в порядке добавления"""
+        alive = self.live_edges()
+        return (
+            np.frombuffer(self.edge_from, dtype=np.int32)[alive],
+            np.frombuffer(self.edge_to, dtype=np.int32)[alive],
+        )
+
+    def incidence(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Живые ребра у вершин в CSR: ребра v - edges[offsets[v]:offsets[v + 1]]
+
+        Снимок на момент вызова: удаленные позже ребра надо отсеивать по
+        edge_removed, добавленных позже в нем нет.
+        """
+        alive = self.live_edges()
+        a, b = self.edges()
+        sources = np.concatenate([a, b])
+        order = np.argsort(sources, kind="stable")
+        offsets = np.zeros(len(self.x) + 1, np.int64)
+        np.cumsum(np.bincount(sources, minlength=len(self.x)), out=offsets[1:])
+        return offsets, np.concatenate([alive, alive])[order]
+
+
+class BuildStats:
+    """Время, память и счетчики стадий сборки (включается флагом profile)
+
+    Конец стадии отмечается вызовом lap(name): стадия длится от предыдущего
+    lap. Пиковая память считается по tracemalloc, поэтому с профилированием
+    сборка заметно медленнее - сравнивать стоит стадии между собой.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.stages: Dict[str, dict] = {}
+        self.counters: Dict[str, int] = {}
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._restart()
+
+    def _restart(self):
+        tracemalloc.reset_peak()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+
+    def lap(self, stage: str):
+        self.stages[stage] = {
+            "wall": round(time.perf_counter() - self._wall, 6),
+            "cpu": round(time.process_time() - self._cpu, 6),
+            "peak_kib": tracemalloc.get_traced_memory()[1] // 1024,
+        }
+        self._restart()
+
+    def report(self) -> dict:
+        return {"name": self.name, "stages": self.stages, "counters": self.counters}
+
+
+def format_report(report: dict) -> str:
+    """Одна строка на отчет: стадии по убыванию времени и счетчики"""
+    stages = sorted(report["stages"].items(), key=lambda item: -item[1]["wall"])
+    return (
+        f"{report['name']}: "
+        + ", ".join(
+            f"{stage} {s['wall']:.3f}s/{s['cpu']:.3f}s cpu/{s['peak_kib']} KiB"
+            for stage, s in stages
+        )
+        + " | "
+        + ", ".join(f"{name}={value}" for name, value in report["counters"].items())
+    )
+
+
 class GraphBuilderSVG:
     def __init__(self, src_file_path: str):
 
         self.source_file_path = src_file_path
-        self.points: Set[Tuple[float, float]] = set()
-        self.edges: Set[Tuple[Tuple[float, float], Tuple[float, float]]] = set()
-        self.graph: defaultdict[Tuple[float, float], Set[Tuple[float, float]]] = (
-            defaultdict(set)
-        )
+        self.graph = FloorGraph()
 
         name_args = Path(self.source_file_path).name[:-4].split()
         self.floor = name_args[1]
@@ -53,6 +563,8 @@ class GraphBuilderSVG:
 
         # Максимальное расстояние для связывания комнаты с вершиной
         self.room_link_threshold = 40.0
+        # Индекс вершин графа, строится в _link_rooms_to_graph
+        self.node_index: Optional[SpatialGrid] = None
 
         self.staircase_pattern = "staircase"
         self.no_use_pattern = "no_use"
@@ -65,10 +577,38 @@ class GraphBuilderSVG:
         offset_dict[f'{self.floor} {self.korpus}'] = (self.global_x_offset, self.global_y_offset)
 
         self.remove_offset: bool = True
+        # Писать ли промежуточные json этажа (navigation_graph_with_rooms,
+        # graph, names) - нужны только для отладки
+        self.debug_output: bool = False
+        # json с отступами вместо сжатого в одну строку
+        self.pretty_output: bool = False
+        # Сливать вершины ближе этого расстояния и резать ребра в Т-стыках
+        # (0 - только точное совпадение координат)
+        self.snap_tolerance: float = 0.0
+        self.snap_report: Optional[dict] = None
+        # Схлопывать ли цепочки вершин степени 2 без комнат в одно ребро
+        self.contract_corridors: bool = False
+        # Исходные ломаные схлопнутых ребер: (a, b) -> [a, ..., b], номера вершин
+        self.polylines: Dict[Tuple[int, int], List[int]] = {}
+        self.contraction_report: Optional[dict] = None
+        # Замер стадий и счетчики; при profile=False не создается вовсе
+        self.profile: bool = False
+        self.stats: Optional[BuildStats] = None
+        # Отчет профилирования этажа, в том числе пришедший из воркера
+        self.profile_report: Optional[dict] = None
+
+        # Счетчики для отчета профилирования. tags_scanned, paths_parsed и
+        # edges_added считаются только при self.stats, остальные растут на
+        # редких ветках и копятся всегда
+        self.tags_scanned = 0
+        self.tags_skipped = 0
+        self.paths_parsed = 0
+        self.edges_added = 0
+        self.edges_degenerate = 0
+        self.edges_rejected = 0
 
         file_path = Path(self.source_file_path)
         self.output_folder_name = file_path.parent.parent / file_path.stem
-        os.makedirs(self.output_folder_name, exist_ok=True)
 
         self.final_folder_path = Path(".\\Matmekh.Maps\\Matmekh.Maps\\Infrastructure")
 
@@ -78,11 +618,14 @@ class GraphBuilderSVG:
         self.graph_json_path = os.path.join(self.output_folder_name, "graph.json")
         self.names_json_path = os.path.join(self.output_folder_name, "names.json")
 
+        # Кэш готовых этажей, ключ - хэш svg, настроек и кода парсера
+        self.cache_folder = file_path.parent.parent / ".build_cache"
+
         self.coordinate_patterns = [
-            re.compile(r"translate\(([\d.]+) ([\d.]+)\)"),
-            re.compile(r"matrix\([-\d.]+ [-\d.]+ [-\d.]+ [-\d.]+ ([\d.]+) ([\d.]+)\)"),
-            re.compile(r'd="M([\d.]+) ([\d.]+)'),
-            re.compile(r'x="([\d.]+)" y="([\d.]+)"'),
+            re.compile(r"translate\(([\d.]+)\s+([\d.]+)\)"),
+            re.compile(r"matrix\([-\d.]+\s+[-\d.]+\s+[-\d.]+\s+[-\d.]+\s+([\d.]+)\s+([\d.]+)\)"),
+            re.compile(r'd="M([\d.]+)\s+([\d.]+)'),
+            re.compile(r'x="([\d.]+)"\s+y="([\d.]+)"'),
         ]
 
         self.names_result = {}
@@ -93,37 +636,76 @@ class GraphBuilderSVG:
 
         # 1. Парсим файлик и вносим все нужные данные
         self._parse_svg_file()
+        if self.stats is not None:
+            self.stats.lap("parse_svg_file")
+
+        # 1.5. Сливаем почти совпадающие концы путей (фигма пишет 1458.38 и 1458.3800001)
+        if self.snap_tolerance > 0:
+            self._snap_vertices()
+            report = self.snap_report
+            print(
+                f"{report['floor']}: слито вершин {report['merged']}, "
+                f"Т-стыков {report['t_junctions']}"
+            )
+            if self.stats is not None:
+                self.stats.lap("snap")
 
         # 2. Привязываем кабинеты к ближайшим вершинам
         self._link_rooms_to_graph()
+        if self.stats is not None:
+            self.stats.lap("link_rooms")
 
     def _parse_svg_file(self):
         groups_stack = []
-        skip_flag: bool = False
-
-        with open(self.source_file_path) as f:
-            for s in f:
-                tag = re.search(r"(\S+ )|(<\S+>)", s).group()[1:-1]
+        # длина стека, на которой открылась группа no_use (None - не пропускаем)
+        skip_level: Optional[int] = None
+        # id текста, содержимое которого сейчас собираем до </text>
+        text_id: Optional[str] = None
+        text_parts: List[str] = []
+
+        component_re = re.compile(self.component_pattern)
+        staircase_re = re.compile(self.staircase_pattern)
+
+        skipped = 0
+        profiling = self.stats is not None
+
+        with open(self.source_file_path, encoding="utf-8") as f:
+            tags = iter_svg_tags(f)
+            if profiling:
+                tags = self._count_tags(tags)
+            for tag, raw in tags:
+                if text_id is not None:
+                    # координаты текста лежат во вложенном <tspan>
+                    text_parts.append(raw)
+                    if tag == "/text":
+                        self._add_room_by_id(" ".join(text_parts), text_id)
+                        text_id = None
+                    continue
                 if tag not in self.valid_tags:
+                    skipped += 1
                     continue
                 if tag == "/g":
                     if len(groups_stack) > 0:
-                        dropped_group = groups_stack.pop()
-                        if self.no_use_pattern in dropped_group:
-                            skip_flag = False
+                        groups_stack.pop()
+                        if skip_level is not None and len(groups_stack) < skip_level:
+                            skip_level = None
                     continue
-                if skip_flag:
-                    continue
-                id_match = re.search(r' id=.+?"', s)
-                if not id_match:
-                    continue
-                id = id_match.group()[5:-1]
-                if tag == "g":
+                id_match = _SVG_ID_RE.search(raw)
+                id = id_match.group(1) if id_match else ""
+                if tag == "g" and not raw.endswith("/>"):
                     groups_stack.append(id)
+                    if skip_level is not None:
+                        skipped += 1
+                        continue
                     if self.no_use_pattern in id:
-                        skip_flag = True
+                        skip_level = len(groups_stack)
+                elif skip_level is not None:
+                    skipped += 1
+                    continue
+                if not id:
+                    continue
 
-                if re.search(self.component_pattern, id):
+                if component_re.search(id):
                     parsed_id = id.split()
                     if len(parsed_id) != 4:
                         raise RuntimeError("invalid component format")
@@ -133,26 +715,51 @@ class GraphBuilderSVG:
                     if parsed_id[3] == "yes":
                         offset_dict[f'{self.floor} {self.korpus}'] = (self.global_x_offset, self.global_y_offset)
 
-                elif re.search(r"graph", id):
-                    self._parse_path_data(s)
+                elif "graph" in id:
+                    self._parse_path_data(raw)
+                    if profiling:
+                        self.paths_parsed += 1
 
                 elif (
-                    groups_stack[-1] == "rooms_numbers"
-                    or groups_stack[-1] == "room_ids"
-                ) and tag == "text":
-                    self._add_room_by_id(s, id)
+                    groups_stack
+                    and (
+                        groups_stack[-1] == "rooms_numbers"
+                        or groups_stack[-1] == "room_ids"
+                    )
+                    and tag == "text"
+                ):
+                    text_id, text_parts = self._add_room_or_wait(raw, id)
 
                 elif (
                     len(groups_stack) > 2
-                    and re.search(self.staircase_pattern, groups_stack[-2])
+                    and staircase_re.search(groups_stack[-2])
                     and (tag == "path" or tag == "text")
                 ):
                     if any((ptrn in id) for ptrn in self.general_staircases_patterns):
-                        self._add_room_by_id(s, id)
+                        text_id, text_parts = self._add_room_or_wait(raw, id)
 
                 # вот и все ифы получается
                 # print("aboba")
 
+        self.tags_skipped += skipped
+        if profiling:
+            # до freeze в графе все ребра, прошедшие _add_edge, с повторами
+            self.edges_added = self.graph.edge_count
+        self.graph.freeze()
+
+    def _count_tags(self, tags):
+        """Пропускает теги насквозь, считая их (только при профилировании)"""
+        for item in tags:
+            self.tags_scanned += 1
+            yield item
+
+    def _add_room_or_wait(self, raw: str, id: str) -> Tuple[Optional[str], List[str]]:
+        """Добавляет комнату сразу или, для незакрытого <text>, ждёт его содержимое"""
+        if raw.startswith("<text") and not raw.endswith("/>"):
+            return id, [raw]
+        self._add_room_by_id(raw, id)
+        return None, []
+
     def _add_room_by_id(self, s, id):
         for ptrn in self.coordinate_patterns:
             xy_match = re.search(ptrn, s)
@@ -160,7 +767,7 @@ class GraphBuilderSVG:
                 x, y = float(xy_match.group(1)), float(xy_match.group(2))
                 break
         else:
-            RuntimeError("somehow regex didnt work")
+            raise RuntimeError("somehow regex didnt work")
 
         self.rooms.append(
             RoomInfo(
@@ -172,225 +779,260 @@ class GraphBuilderSVG:
 
     def _parse_path_data(self, path_data: str):
         """Парсит данные пути из SVG"""
-        path_data = re.search(r' d="(.+?)"', path_data).group(1)
-        commands = []
-        current_command = None
-        current_args = []
-
-        i = 0
-        while i < len(path_data):
-            char = path_data[i]
-
-            if char.isalpha():
-                if current_command is not None:
-                    commands.append((current_command, current_args))
-                current_command = char
-                current_args = []
-            elif char in " ,":
-                if current_args and current_args[-1] != "":
-                    current_args.append("")
-            else:
-                if not current_args:
-                    current_args.append("")
-                current_args[-1] += char
-
-            i += 1
-
-        if current_command is not None:
-            commands.append((current_command, current_args))
-
-        # Обработка команд
-        current_point = (0.0, 0.0)
-        start_point = None
-
-        for command, args in commands:
-            numeric_args = []
-            for arg in args:
-                if arg.strip():
-                    try:
-                        numeric_args.append(float(arg))
-                    except ValueError:
-                        continue
-
-            if command == "M":  # MoveTo
-                for j in range(0, len(numeric_args), 2):
-                    if j + 1 < len(numeric_args):
-                        x, y = numeric_args[j], numeric_args[j + 1]
-                        current_point = (
-                            x + self.global_x_offset,
-                            y + self.global_y_offset,
-                        )
-                        if start_point is None:
-                            start_point = current_point
-                        self.points.add(current_point)
-
-            elif command == "L":  # LineTo
-                for j in range(0, len(numeric_args), 2):
-                    if j + 1 < len(numeric_args):
-                        x, y = numeric_args[j], numeric_args[j + 1]
-                        new_point = (x + self.global_x_offset, y + self.global_y_offset)
-                        self._add_edge(current_point, new_point)
-                        current_point = new_point
-                        self.points.add(current_point)
-
-            elif command == "H":  # Horizontal Line
-                for x in numeric_args:
-                    new_point = (x + self.global_x_offset, current_point[1])
-                    self._add_edge(current_point, new_point)
-                    current_point = new_point
-                    self.points.add(current_point)
-
-            elif command == "V":  # Vertical Line
-                for y in numeric_args:
-                    new_point = (current_point[0], y + self.global_y_offset)
-                    self._add_edge(current_point, new_point)
-                    current_point = new_point
-                    self.points.add(current_point)
-
-            elif command == "Z":  # Close Path
-                if start_point is not None:
-                    self._add_edge(current_point, start_point)
-                    current_point = start_point
+        d_match = _PATH_D_RE.search(path_data)
+        if d_match is None:
+            raise RuntimeError("path without d attribute")
 
-            else:
-                raise RuntimeError(f"unexpected command: {command}.")
+        segments = parse_path_segments(
+            d_match.group(1), self.global_x_offset, self.global_y_offset
+        )
+        for j in range(0, len(segments), 4):
+            p1 = (segments[j], segments[j + 1])
+            p2 = (segments[j + 2], segments[j + 3])
+            self._add_edge(p1, p2)
 
     def _add_edge(self, p1: Tuple[float, float], p2: Tuple[float, float]):
         """Добавляет ребро в граф, проверяя коллинеарность"""
         if p1 == p2:
+            self.edges_degenerate += 1
             return
 
         # Проверяем, нет ли уже более коротких ребер между этими точками
         if not self._is_edge_redundant(p1, p2):
-            self.graph[p1].add(p2)
-            self.graph[p2].add(p1)
-            self.edges.add((p1, p2))
+            self.graph.add_edge(self.graph.vertex(p1), self.graph.vertex(p2))
+        else:
+            self.edges_rejected += 1
 
     def _is_edge_redundant(
         self, p1: Tuple[float, float], p2: Tuple[float, float]
     ) -> bool:
-        # return False
-        """Проверяет, является ли ребро избыточным"""
-        # Проверяем, есть ли путь между p1 и p2 через другие точки
-        visited = set()
-        stack = [p1]
-
-        while stack:
-            current = stack.pop()
-            if current == p2:
-                return True
-
-            visited.add(current)
-
-            for neighbor in self.graph[current]:
-                if neighbor not in visited and neighbor != p1 and neighbor != p2:
-                    stack.append(neighbor)
+        """Проверяет, является ли ребро избыточным
 
+        Раньше здесь на каждое ребро запускался DFS по всему графу в поисках
+        пути p1 -> p2 через другие точки. Соседи, равные p2, в стек не
+        попадали, поэтому путь не находился никогда и ни одно ребро не
+        отбрасывалось (проверено на всех этажах). Ответ тот же, но за O(1).
+        """
         return False
 
-    def _link_rooms_to_graph(self):
-        """Привязывает кабинеты к ближайшим вершинам графа"""
-        for room in self.rooms:
-            closest_node = None
-            min_distance = float("inf")
-
-            for node in self.graph.keys():
-                distance = sqrt((room.x - node[0]) ** 2 + (room.y - node[1]) ** 2)
-
-                if distance < min_distance and distance < self.room_link_threshold:
-                    min_distance = distance
-                    closest_node = node
+    def _snap_vertices(self):
+        vertices_before = self.graph.vertex_count
+        merged, edges_dropped = self.graph.snap(self.snap_tolerance)
+        t_junctions = self.graph.split_t_junctions(self.snap_tolerance)
+        self.snap_report = {
+            "floor": f"{self.floor} {self.korpus}",
+            "merged": merged,
+            "edges_dropped": edges_dropped,
+            "t_junctions": t_junctions,
+            "nodes": [vertices_before, self.graph.vertex_count],
+        }
+
+    def _build_node_index(self) -> SpatialGrid:
+        """Строит сетку по вершинам графа с ячейкой room_link_threshold"""
+        return SpatialGrid(
+            self.room_link_threshold, *self.graph.coords(), self.graph.vertices()
+        )
 
-            if closest_node:
-                if isinstance(self.graph[closest_node], Dict):
-                    print("room double count .__.")  # почему случается?????
-                    continue
-                closest_node_neighbour = self.graph[closest_node].pop()
-                del self.graph[closest_node]
-                self.graph[closest_node_neighbour].remove(closest_node)
-                if (closest_node_neighbour, closest_node) in self.edges:
-                    self.edges.remove((closest_node_neighbour, closest_node))
-                elif (closest_node, closest_node_neighbour) in self.edges:
-                    self.edges.remove((closest_node, closest_node_neighbour))
-                else:
-                    raise RuntimeError(f"ошибка при обработке комнаты {room.number}")
-
-                room.node_id = closest_node_neighbour
-                # Добавляем информацию о комнате в граф
-                if "rooms" not in self.graph[room.node_id]:
-                    self.graph[room.node_id] = {"neighbors": set(), "rooms": []}
-                elif isinstance(self.graph[room.node_id], set):
-                    # Конвертируем старую структуру в новую
-                    neighbors = self.graph[room.node_id]
-                    self.graph[room.node_id] = {"neighbors": neighbors, "rooms": []}
-                    raise RuntimeError("две комнаты под одной вершиной графа")
-
-                self.graph[room.node_id]["rooms"].append(room.number)
-
-    def _export_with_rooms(self, output_path: str):
-        """Экспортирует граф с информацией о комнатах"""
-        import json
-
-        output_data = {"nodes": [], "edges": [], "rooms": []}
-
-        # Создаем mapping точек в ID
-        node_ids = {}
-        for idx, point in enumerate(self.graph.keys()):
-            node_id = f"node_{idx}"
-            node_ids[point] = node_id
-
-            node_data = {
-                "id": node_id,
-                "x": point[0],
-                "y": point[1],
-            }
+    def _link_rooms_to_graph(self):
+        """Привязывает кабинеты к ближайшим вершинам графа
+
+        Кабинет на схеме - тупиковый отросток коридора: его конец удаляется,
+        а кабинет записывается на вершину коридора, к которой он шел.
+        """
+        g = self.graph
+        self.node_index = self._build_node_index()
+        offsets, incident = g.incidence()
+        g.room_vertex = np.full(len(self.rooms), -1, np.int32)
+
+        for i, room in enumerate(self.rooms):
+            closest_node = self.node_index.nearest(
+                room.x, room.y, self.room_link_threshold
+            )
+            if closest_node is None:
+                continue
+            if g.has_room[closest_node]:
+                print("room double count .__.")  # почему случается?????
+                continue
+
+            edges = [
+                e
+                for e in incident[offsets[closest_node] : offsets[closest_node + 1]].tolist()
+                if not g.edge_removed[e] and not g.removed[g.other_end(e, closest_node)]
+            ]
+            if not edges:
+                raise RuntimeError(f"ошибка при обработке комнаты {room.number}")
+            closest_node_neighbour = g.other_end(edges[0], closest_node)
+
+            g.remove_vertex(closest_node)
+            self.node_index.remove(closest_node)
+            # ребро к отростку убирается одно, в какую сторону бы оно ни шло
+            g.remove_edge(
+                next(
+                    (e for e in edges if g.edge_from[e] == closest_node_neighbour),
+                    edges[0],
+                )
+            )
 
+            g.room_vertex[i] = closest_node_neighbour
+            g.has_room[closest_node_neighbour] = 1
+
+    def _contract_corridors(self):
+        """Схлопывает цепочки вершин степени 2 в одно ребро с длиной ломаной
+
+        Вершины с комнатами (в том числе лестницы и лифты) не трогаются.
+        Цепочка остается как есть, если её концы совпадают или уже соединены
+        ребром - иначе появились бы петли и кратные ребра.
+        """
+        g = self.graph
+        # новые ребра цепочек в incidence не попадают, но их концы и не
+        # бывают внутренними вершинами следующих цепочек
+        offsets, incident = g.incidence()
+        adjacency: defaultdict[int, Set[int]] = defaultdict(set)
+        # ребро к удаленному отростку кабинета остается живым, но удаленная
+        # вершина не должна стать ни соседом, ни концом цепочки
+        for a, b in zip(*(e.tolist() for e in g.edges())):
+            if g.removed[a] or g.removed[b]:
+                continue
+            adjacency[a].add(b)
+            adjacency[b].add(a)
+
+        def is_inner(v: int) -> bool:
+            return not g.removed[v] and not g.has_room[v] and len(adjacency[v]) == 2
+
+        nodes_before, edges_before = g.vertex_count, g.edge_count
+        visited: Set[int] = set()
+
+        for v in g.vertices().tolist():
+            if v in visited or not is_inner(v):
+                continue
+
+            # идем от вершины в обе стороны до первой "настоящей" вершины
+            chain = [v]
+            visited.add(v)
+            ends = []
+            for direction in sorted(adjacency[v], key=g.point):
+                prev, current = v, direction
+                side = []
+                while is_inner(current) and current not in visited:
+                    visited.add(current)
+                    side.append(current)
+                    prev, current = current, next(
+                        n for n in adjacency[current] if n != prev
+                    )
+                ends.append((current, side))
+            (a, left), (b, right) = ends
+            chain = left[::-1] + chain + right
+
+            if a == b or a in chain or b in adjacency[a]:
+                continue
+
+            for inner in chain:
+                for neighbour in adjacency.pop(inner):
+                    adjacency[neighbour].discard(inner)
+                for e in incident[offsets[inner] : offsets[inner + 1]].tolist():
+                    g.remove_edge(e)
+                g.remove_vertex(inner)
+                if self.node_index is not None:
+                    self.node_index.remove(inner)
+
+            g.add_edge(a, b)
+            adjacency[a].add(b)
+            adjacency[b].add(a)
+            self.polylines[(a, b)] = [a] + chain + [b]
+
+        self.contraction_report = {
+            "floor": f"{self.floor} {self.korpus}",
+            "nodes": [nodes_before, g.vertex_count],
+            "edges": [edges_before, g.edge_count],
+        }
+
+    def _export_with_rooms(self, output_path: Optional[str] = None) -> dict:
+        """Экспортирует граф с информацией о комнатах
+
+        Файл пишется только если передан output_path (отладочный вывод).
+        """
+        g = self.graph
+        xs, ys = g.coords()
+        vertices = g.vertices()
+        # номер вершины -> idx в node_{idx}, -1 у удаленных
+        node_index = np.full(len(xs), -1, np.int64)
+        node_index[vertices] = np.arange(len(vertices))
+
+        rooms_at: defaultdict[int, List[str]] = defaultdict(list)
+        for room, v in zip(self.rooms, g.room_vertex.tolist()):
+            if v >= 0:
+                rooms_at[v].append(room.number)
+
+        output_data = {"nodes": [], "edges": [], "rooms": [], "polylines": []}
+
+        for idx, (v, x, y) in enumerate(
+            zip(vertices.tolist(), xs[vertices].tolist(), ys[vertices].tolist())
+        ):
+            node_data = {"id": f"node_{idx}", "x": x, "y": y}
             # Добавляем информацию о комнатах, если есть
-            if isinstance(self.graph[point], dict) and "rooms" in self.graph[point]:
-                node_data["rooms"] = self.graph[point]["rooms"]
-
+            if v in rooms_at:
+                node_data["rooms"] = rooms_at[v]
             output_data["nodes"].append(node_data)
 
-        # Добавляем ребра
-        for edge in self.edges:
-            p1, p2 = edge
-            if p1 in node_ids and p2 in node_ids:
-                output_data["edges"].append({"from": node_ids[p1], "to": node_ids[p2]})
+        # Ребра с удаленным концом пропускаются
+        a, b = g.edges()
+        a, b = node_index[a], node_index[b]
+        keep = (a >= 0) & (b >= 0)
+        output_data["edges"] = [
+            {"from": f"node_{p1}", "to": f"node_{p2}"}
+            for p1, p2 in zip(a[keep].tolist(), b[keep].tolist())
+        ]
 
-        # Добавляем информацию о комнатах
-        for room in self.rooms:
+        for room, v in zip(self.rooms, g.room_vertex.tolist()):
             output_data["rooms"].append(
                 {
                     "number": room.number,
                     "x": room.x,
                     "y": room.y,
-                    "node_id": node_ids.get(room.node_id) if room.node_id else None,
+                    "node_id": f"node_{node_index[v]}" if v >= 0 else None,
+                }
+            )
+
+        # Ломаные схлопнутых ребер, чтобы интерфейс мог нарисовать точный путь
+        for (p1, p2), chain in self.polylines.items():
+            points = [g.point(v) for v in chain]
+            output_data["polylines"].append(
+                {
+                    "from": f"node_{node_index[p1]}",
+                    "to": f"node_{node_index[p2]}",
+                    "length": sum(
+                        sqrt((q[0] - r[0]) ** 2 + (q[1] - r[1]) ** 2)
+                        for q, r in zip(points, points[1:])
+                    ),
+                    "points": [list(point) for point in points],
                 }
             )
 
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(output_data, f, indent=2, ensure_ascii=False)
+        if output_path is not None:
+            write_json_output([Path(output_path)], output_data, self.pretty_output)
+
+        return output_data
 
     def _visualize(self):
         """Визуализирует граф с комнатами (для отладки)"""
         import matplotlib.pyplot as plt
 
         fig, ax = plt.subplots(figsize=(12, 8))
+        g = self.graph
+        xs, ys = g.coords()
 
         # Рисуем ребра
-        for edge in self.edges:
-            p1, p2 = edge
-            x_values = [p1[0], p2[0]]
-            y_values = [p1[1], p2[1]]
+        for p1, p2 in zip(*g.edges()):
+            x_values = [xs[p1], xs[p2]]
+            y_values = [ys[p1], ys[p2]]
             ax.plot(x_values, y_values, "b-", alpha=0.7, linewidth=1)
 
         # Рисуем вершины
-        nodes_x = [p[0] for p in self.graph.keys()]
-        nodes_y = [p[1] for p in self.graph.keys()]
-        ax.scatter(nodes_x, nodes_y, c="red", s=30, zorder=5)
+        vertices = g.vertices()
+        ax.scatter(xs[vertices], ys[vertices], c="red", s=30, zorder=5)
 
         # Рисуем номера кабинетов
-        for room in self.rooms:
+        for room, node in zip(self.rooms, g.room_vertex.tolist()):
             ax.text(
                 room.x,
                 room.y,
@@ -402,11 +1044,10 @@ class GraphBuilderSVG:
             )
 
             # Показываем связь с вершиной
-            if room.node_id:
-                node = room.node_id
+            if node >= 0:
                 ax.plot(
-                    [room.x, node[0]],
-                    [room.y, node[1]],
+                    [room.x, xs[node]],
+                    [room.y, ys[node]],
                     "g--",
                     alpha=0.3,
                     linewidth=0.5,
@@ -418,21 +1059,60 @@ class GraphBuilderSVG:
         plt.show()
 
     def run(self):
+        stats = None
+        if self.profile:
+            stats = self.stats = BuildStats(f"{self.floor} {self.korpus}")
+
         self._process_svg()
+        if self.contract_corridors:
+            self._contract_corridors()
+            report = self.contraction_report
+            print(
+                f"{report['floor']}: вершин {report['nodes'][0]} -> {report['nodes'][1]}, "
+                f"ребер {report['edges'][0]} -> {report['edges'][1]}"
+            )
+            if stats is not None:
+                stats.lap("contract_corridors")
         # self._visualize()
-        self._export_with_rooms(self.stupid_json_path)
-        # self._convert_to_sensible_format()
-
-        self._convert_to_correct_format()
-        self.dump_correct_json(self.correct_graph, self.correct_names)
-
-    def _convert_to_sensible_format(self):
-
-        dicta = {}
-
-        with open(self.stupid_json_path, "r", encoding="utf-8") as file:
-            dicta = json.load(file)
+        if self.debug_output:
+            os.makedirs(self.output_folder_name, exist_ok=True)
+        dicta = self._export_with_rooms(
+            self.stupid_json_path if self.debug_output else None
+        )
+        if stats is not None:
+            stats.lap("export")
+        # self._convert_to_sensible_format(dicta)
+
+        self._convert_to_correct_format(dicta)
+        if self.debug_output:
+            self.dump_correct_json(self.correct_graph, self.correct_names)
+        if stats is not None:
+            stats.lap("convert")
+            self._collect_counters()
+            self.profile_report = stats.report()
+
+    def _collect_counters(self):
+        linked = int((self.graph.room_vertex >= 0).sum())
+        snap = self.snap_report or {}
+        self.stats.counters.update(
+            {
+                "bytes_scanned": os.path.getsize(self.source_file_path),
+                "tags_scanned": self.tags_scanned,
+                "tags_skipped": self.tags_skipped,
+                "paths_parsed": self.paths_parsed,
+                "edges_added": self.edges_added,
+                "edges_degenerate": self.edges_degenerate,
+                "edges_rejected": self.edges_rejected,
+                # ребра в графе после слияния вершин и привязки кабинетов
+                "edges_live": self.graph.edge_count,
+                "vertices_snapped": snap.get("merged", 0),
+                "t_junctions_split": snap.get("t_junctions", 0),
+                "rooms_linked": linked,
+                "rooms_unlinked": len(self.rooms) - linked,
+            }
+        )
 
+    def _convert_to_sensible_format(self, dicta: dict):
         nodes = dicta["nodes"]
         edges = dicta["edges"]
         names = dicta["rooms"]
@@ -472,12 +1152,7 @@ class GraphBuilderSVG:
     def get_new_name(self, name):
         return f"{name} {self.korpus}"
 
-    def _convert_to_correct_format(self):
-        dicta = {}
-
-        with open(self.stupid_json_path, "r", encoding="utf-8") as file:
-            dicta = json.load(file)
-
+    def _convert_to_correct_format(self, dicta: dict):
         nodes = dicta["nodes"]
         edges = dicta["edges"]
         names = dicta["rooms"]
@@ -505,16 +1180,155 @@ class GraphBuilderSVG:
             node_name = self.get_new_id(name["node_id"])
             self.correct_names[room_name] = node_name
 
+        self.correct_polylines: List[dict] = [
+            dict(
+                polyline,
+                **{
+                    "from": self.get_new_id(polyline["from"]),
+                    "to": self.get_new_id(polyline["to"]),
+                },
+            )
+            for polyline in dicta["polylines"]
+        ]
+
+    def result(self) -> dict:
+        """Готовый этаж: то, что уходит из воркера в кэш и на слияние"""
+        return {
+            "graph": self.correct_graph,
+            "names": self.correct_names,
+            "polylines": self.correct_polylines,
+            "offset": offset_dict[f"{self.floor} {self.korpus}"],
+            "profile": self.profile_report,
+        }
+
+    def apply_result(self, result: dict):
+        self.correct_graph = {
+            node_id: Node(*node) for node_id, node in result["graph"].items()
+        }
+        self.correct_names = result["names"]
+        self.correct_polylines = result["polylines"]
+        self.profile_report = result.get("profile")
+        offset_dict[f"{self.floor} {self.korpus}"] = tuple(result["offset"])
+
+    def _settings(self) -> dict:
+        """Настройки парсера, от которых зависит результат"""
+        return {
+            "room_link_threshold": self.room_link_threshold,
+            "valid_tags": sorted(self.valid_tags),
+            "staircase_pattern": self.staircase_pattern,
+            "no_use_pattern": self.no_use_pattern,
+            "component_pattern": self.component_pattern,
+            "general_staircases_patterns": sorted(self.general_staircases_patterns),
+            "coordinate_patterns": [p.pattern for p in self.coordinate_patterns],
+            "remove_offset": self.remove_offset,
+            "contract_corridors": self.contract_corridors,
+            "snap_tolerance": self.snap_tolerance,
+        }
+
+    def cache_key(self) -> str:
+        h = hashlib.sha256()
+        with open(self.source_file_path, "rb") as f:
+            h.update(f.read())
+        h.update(json.dumps(self._settings(), sort_keys=True).encode("utf-8"))
+        h.update(_parser_code_hash().encode("ascii"))
+        return h.hexdigest()
+
+    def _cache_path(self, key: str) -> Path:
+        return self.cache_folder / f"{Path(self.source_file_path).stem} {key}.json"
+
+    def load_cache(self) -> bool:
+        """Подгружает этаж из кэша; False, если svg или настройки поменялись
+
+        Битая запись (старую сборку прервали на записи) - тоже промах, её
+        перезапишет store_cache. С debug_output кэш не читается: отладочные
+        файлы этажа пишет только настоящая сборка.
+        """
+        if self.debug_output:
+            return False
+        cache_path = self._cache_path(self.cache_key())
+        if not cache_path.exists():
+            return False
+
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                self.apply_result(json.load(f))
+        except (ValueError, KeyError):
+            return False
+        return True
+
+    def store_cache(self):
+        """Сохраняет готовый этаж в кэш и удаляет его устаревшие записи"""
+        os.makedirs(self.cache_folder, exist_ok=True)
+        cache_path = self._cache_path(self.cache_key())
+
+        # отчет профилирования относится к этой сборке, а не к кэшу
+        _replace_file(
+            cache_path,
+            json.dumps(dict(self.result(), profile=None), ensure_ascii=False).encode("utf-8"),
+        )
+
+        stem = Path(self.source_file_path).stem
+        for stale_path in self.cache_folder.glob(f"{glob.escape(stem)} *.json"):
+            if stale_path != cache_path and stale_path.stem.rsplit(" ", 1)[0] == stem:
+                os.remove(stale_path)
+
     def dump_correct_json(self, result_graph, result_names):
-        with open(self.graph_json_path, "w", encoding="utf-8") as f:
-            json.dump(result_graph, f, ensure_ascii=False, indent=2)
+        write_json_output([Path(self.graph_json_path)], result_graph, self.pretty_output)
+        write_json_output([Path(self.names_json_path)], result_names, self.pretty_output)
+
+
+def _replace_file(path: Path, content: bytes):
+    """Пишет во временный файл рядом и подменяет им path
+
+    Сервер, читающий файл в это время, видит либо старый файл, либо новый
+    целиком.
+    """
+    tmp_path = Path(f"{path}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def write_json_output(
+    paths: List[Path], data, pretty: bool = False, compress: bool = False
+):
+    """Сериализует data один раз и пишет во все paths
+
+    По умолчанию json без пробелов, pretty - с отступами для отладки; ключи
+    в обоих случаях по алфавиту, чтобы сборки можно было сравнивать. С
+    compress рядом лежат .gz и .br (если установлен brotli) для статической
+    раздачи; .br, который без brotli уже не обновить, удаляется.
+    """
+    if pretty:
+        text = json.dumps(data, ensure_ascii=False, sort_keys=True, indent=2)
+    else:
+        text = json.dumps(
+            data, ensure_ascii=False, sort_keys=True, separators=(",", ":")
+        )
+    raw = text.encode("utf-8")
+
+    variants = {"": raw}
+    if compress:
+        # mtime=0 - одинаковый json дает одинаковый .gz
+        variants[".gz"] = gzip.compress(raw, compresslevel=9, mtime=0)
+        if brotli is not None:
+            variants[".br"] = brotli.compress(raw)
+
+    for path in paths:
+        for suffix, content in variants.items():
+            _replace_file(Path(f"{path}{suffix}"), content)
+        stale_br = Path(f"{path}.br")
+        if compress and brotli is None and stale_br.exists():
+            os.remove(stale_br)
+
+
+def get_final_coordinate(x: float, y: float, floor: str, korpus: str):
+    x_offset, y_offset = offset_dict[f'{floor} {korpus}']
+    return f"{int(x-x_offset)} {int(y-y_offset)} {korpus}_{floor}"
 
-        with open(self.names_json_path, "w", encoding="utf-8") as f:
-            json.dump(result_names, f, ensure_ascii=False, indent=2)
 
 def get_final_node_coordinate(node: Node):
-    x_offset, y_offset = offset_dict[f'{node.floor} {node.korpus}']
-    return f"{int(node.x-x_offset)} {int(node.y-y_offset)} {node.korpus}_{node.floor}"
+    return get_final_coordinate(node.x, node.y, node.floor, node.korpus)
 
 
 name_change_dict: Dict[str, str] = {
@@ -530,123 +1344,615 @@ name_change_dict: Dict[str, str] = {
 }
 
 
-def merge_correct_jsons(parsers: List[GraphBuilderSVG], result_folder_path: Path):
-    ans_dict_graph: Dict[str, Node] = {}
-    ans_dict_names: Dict[str, str] = {}
-    staircases_patterns = frozenset(["staircase", "lifts"])
-    staircases: Dict[str, Dict[int, str]] = defaultdict(
-        dict
-    )  # [dict[stair_index -> dict[floor -> name]] ]
+STAIRCASES_PATTERNS = frozenset(["staircase", "lifts"])
 
-    for p in parsers:
-        ans_dict_graph.update(p.correct_graph)
-        ans_dict_names.update(p.correct_names)
-        for key in p.correct_names:
-            t = key.split()
-            if t[0] in staircases_patterns:
-                index = "1" if len(t) < 4 else t[2]
-                staircases[f"{t[0]}:{index}:{p.korpus}"][t[1]] = key
-
-    for stair in staircases.keys():
-        floors = sorted(staircases[stair].keys())
-        for i in range(1, len(floors)):
-            ans_dict_graph[
-                ans_dict_names[staircases[stair][floors[i - 1]]]
-            ].neighbours.append(ans_dict_names[staircases[stair][floors[i]]])
-            ans_dict_graph[
-                ans_dict_names[staircases[stair][floors[i]]]
-            ].neighbours.append(ans_dict_names[staircases[stair][floors[i - 1]]])
-
-    with open(
-        parsers[0].output_folder_name.parent / Path("ans_graph.json"),
-        "w",
-        encoding="utf-8",
-    ) as f:
-        json.dump(ans_dict_graph, f, ensure_ascii=False, indent=2)
-
-    with open(
-        parsers[0].output_folder_name.parent / Path("ans_names.json"),
-        "w",
-        encoding="utf-8",
-    ) as f:
-        json.dump(ans_dict_names, f, ensure_ascii=False, indent=2)
-
-    ans_ans_dict_names = {}
-    ans_ans_dict_graph = {}
-
-    for node_id in ans_dict_graph.keys():
-        curr_node = ans_dict_graph[node_id]
-        
-        node_coordinate = get_final_node_coordinate(curr_node)
-
-        ans_ans_dict_graph[node_coordinate] = [
-            get_final_node_coordinate(ans_dict_graph[node_name])
-            for node_name in curr_node.neighbours
-        ]
-        
-
-    for name in ans_dict_names.keys():
-        if any((p in name) for p in staircases_patterns):
-            continue
-        curr_node = ans_dict_graph[ans_dict_names[name]]
-
-        name = " ".join(name.split()[:-1])
-
-        node_coordinate = get_final_node_coordinate(curr_node)
-
-        for str_to_change in name_change_dict.keys():
-            if str_to_change in name:
-                name = re.sub(
-                    pattern=str_to_change,
-                    string=name,
-                    repl=name_change_dict[str_to_change],
-                    count=1,
-                )
-
-        ans_ans_dict_names[name] = node_coordinate
+# (pattern, index, korpus): одна лестница или лифт через все этажи корпуса
+StairKey = Tuple[str, str, str]
 
-    with open(
-        result_folder_path / Path("ans_ans_graph.json"), "w", encoding="utf-8"
-    ) as f:
-        json.dump(ans_ans_dict_graph, f, ensure_ascii=False, indent=2)
 
-    with open(
-        result_folder_path / Path("ans_ans_names.json"), "w", encoding="utf-8"
-    ) as f:
-        json.dump(ans_ans_dict_names, f, ensure_ascii=False, indent=2)
+@dataclass
+class FloorContribution:
+    """Всё, что этаж вносит в общий граф, с уже посчитанными итоговыми строками"""
+
+    key: str
+    # узлы этажа; списки соседей свои, без лестниц
+    graph: Dict[str, Node]
+    names: Dict[str, str]
+    # id узла -> "x y korpus_floor"
+    coordinates: Dict[str, str]
+    # id узла -> итоговые координаты соседей по этажу
+    neighbours: Dict[str, List[str]]
+    # имя -> (имя для ans_ans_names или None для лестниц, id узла)
+    final_names: Dict[str, Tuple[Optional[str], str]]
+    # концы лестниц этажа в порядке имен: (ключ лестницы, этаж из имени, имя)
+    stairs: List[Tuple[StairKey, str, str]]
+    polylines: List[dict]
+    output_folder: Path
+    final_folder_path: Path
+
+
+def final_room_name(name: str) -> str:
+    """Имя кабинета для ans_ans_names: без корпуса и с заменами из name_change_dict"""
+    name = " ".join(name.split()[:-1])
+    for str_to_change in name_change_dict.keys():
+        if str_to_change in name:
+            name = re.sub(
+                pattern=str_to_change,
+                string=name,
+                repl=name_change_dict[str_to_change],
+                count=1,
+            )
+    return name
+
+
+def floor_contribution(p: GraphBuilderSVG) -> FloorContribution:
+    coordinates = {
+        node_id: get_final_node_coordinate(node)
+        for node_id, node in p.correct_graph.items()
+    }
+    stairs = []
+    for key in p.correct_names:
+        t = key.split()
+        if t[0] in STAIRCASES_PATTERNS:
+            index = "1" if len(t) < 4 else t[2]
+            stairs.append(((t[0], index, p.korpus), t[1], key))
+
+    return FloorContribution(
+        key=f"{p.floor} {p.korpus}",
+        graph=dict(p.correct_graph),
+        names=dict(p.correct_names),
+        coordinates=coordinates,
+        neighbours={
+            node_id: [coordinates[n] for n in node.neighbours]
+            for node_id, node in p.correct_graph.items()
+        },
+        final_names={
+            name: (
+                None
+                if any((ptrn in name) for ptrn in STAIRCASES_PATTERNS)
+                else final_room_name(name),
+                node_id,
+            )
+            for name, node_id in p.correct_names.items()
+        },
+        stairs=stairs,
+        polylines=[
+            {
+                "from": coordinates[polyline["from"]],
+                "to": coordinates[polyline["to"]],
+                "length": polyline["length"],
+                "points": [
+                    get_final_coordinate(x, y, p.floor, p.korpus)
+                    for x, y in polyline["points"]
+                ],
+            }
+            for polyline in p.correct_polylines
+        ],
+        output_folder=p.output_folder_name.parent,
+        final_folder_path=p.final_folder_path,
+    )
+
+
+class GraphMerger:
+    """Слияние этажей, в котором этаж можно заменить, не пересчитывая остальные
+
+    Этажи хранятся в порядке добавления, лестницы - в индексе по
+    (pattern, index, korpus). Замена этажа пересчитывает только его вклад и
+    вертикальные связи его лестниц; результат write() побайтно такой же,
+    как у слияния всех этажей с нуля.
+    """
+
+    def __init__(self, pretty: bool = False):
+        # json с отступами вместо сжатого (для отладки)
+        self.pretty = pretty
+        self.floors: Dict[str, FloorContribution] = {}
+        # лестница -> этаж из имени -> имя конца (как staircases в старом слиянии)
+        self.stairs: Dict[StairKey, Dict[str, str]] = {}
+        # лестница -> связи (id, id соседа) в порядке добавления
+        self.stair_links: Dict[StairKey, List[Tuple[str, str]]] = {}
+
+    def set_floor(self, p: GraphBuilderSVG):
+        """Добавляет этаж или заменяет уже добавленный (на его же место)"""
+        part = floor_contribution(p)
+        old = self.floors.get(part.key)
+        self.floors[part.key] = part
+        self._relink({stair for stair, _, _ in part.stairs} | self._stair_keys(old))
+
+    def remove_floor(self, key: str):
+        old = self.floors.pop(key)
+        self._relink(self._stair_keys(old))
+
+    @staticmethod
+    def _stair_keys(part: Optional[FloorContribution]) -> Set[StairKey]:
+        return {stair for stair, _, _ in part.stairs} if part is not None else set()
+
+    def _owner_of_name(self, name: str) -> str:
+        """id узла имени; при одинаковых именах на разных этажах побеждает последний"""
+        node_id = None
+        for part in self.floors.values():
+            if name in part.names:
+                node_id = part.names[name]
+        return node_id
+
+    def _relink(self, stair_keys: Set[StairKey]):
+        for stair in stair_keys:
+            ends: Dict[str, str] = {}
+            for part in self.floors.values():
+                for key, floor, name in part.stairs:
+                    if key == stair:
+                        ends[floor] = name
+            if not ends:
+                self.stairs.pop(stair, None)
+                self.stair_links.pop(stair, None)
+                continue
+            self.stairs[stair] = ends
+
+            floors = sorted(ends.keys())
+            links = []
+            for i in range(1, len(floors)):
+                lower = self._owner_of_name(ends[floors[i - 1]])
+                upper = self._owner_of_name(ends[floors[i]])
+                links.append((lower, upper))
+                links.append((upper, lower))
+            self.stair_links[stair] = links
+
+    def _stair_order(self) -> List[StairKey]:
+        """Лестницы в порядке первого появления по этажам, как в старом слиянии"""
+        order: Dict[StairKey, None] = {}
+        for part in self.floors.values():
+            for stair, _, _ in part.stairs:
+                order.setdefault(stair)
+        return list(order)
+
+    def staircase_links(self) -> int:
+        return sum(max(0, len(ends) - 1) for ends in self.stairs.values())
+
+    def write(self, result_folder_path: Path, stats: Optional[BuildStats] = None):
+        parts = list(self.floors.values())
+
+        ans_dict_graph: Dict[str, Node] = {}
+        ans_dict_names: Dict[str, str] = {}
+        coordinates: Dict[str, str] = {}
+        for part in parts:
+            ans_dict_graph.update(part.graph)
+            ans_dict_names.update(part.names)
+            coordinates.update(part.coordinates)
+
+        vertical: defaultdict[str, List[str]] = defaultdict(list)
+        for stair in self._stair_order():
+            for node_id, neighbour_id in self.stair_links[stair]:
+                vertical[node_id].append(neighbour_id)
+        for node_id, links in vertical.items():
+            node = ans_dict_graph[node_id]
+            ans_dict_graph[node_id] = node._replace(neighbours=node.neighbours + links)
+        if stats is not None:
+            stats.lap("link_staircases")
+
+        write_json_output(
+            [parts[0].output_folder / Path("ans_graph.json")], ans_dict_graph, self.pretty
+        )
+        write_json_output(
+            [parts[0].output_folder / Path("ans_names.json")], ans_dict_names, self.pretty
+        )
+        if stats is not None:
+            stats.lap("write_ans")
+
+        ans_ans_dict_graph = {}
+        for part in parts:
+            for node_id, neighbours in part.neighbours.items():
+                if node_id in vertical:
+                    neighbours = neighbours + [coordinates[n] for n in vertical[node_id]]
+                ans_ans_dict_graph[part.coordinates[node_id]] = neighbours
+
+        final_names: Dict[str, Tuple[Optional[str], str]] = {}
+        for part in parts:
+            final_names.update(part.final_names)
+        ans_ans_dict_names = {}
+        for name, node_id in final_names.values():
+            if name is not None:
+                ans_ans_dict_names[name] = coordinates[node_id]
+        if stats is not None:
+            stats.lap("final_format")
+
+        final_folder_path = parts[-1].final_folder_path
+        # Каждый документ сериализуется один раз и уходит и в результат, и в Infrastructure
+        write_json_output(
+            [
+                result_folder_path / Path("ans_ans_graph.json"),
+                final_folder_path / Path("graph.json"),
+            ],
+            ans_ans_dict_graph,
+            self.pretty,
+            compress=True,
+        )
 
-    with open(
-        p.final_folder_path / Path("graph.json"), "w", encoding="utf-8"
-    ) as f:
-        json.dump(ans_ans_dict_graph, f, ensure_ascii=False, indent=2)
+        # Ломаные схлопнутых коридоров (только при contract_corridors)
+        ans_ans_polylines = [
+            polyline for part in parts for polyline in part.polylines
+        ]
+        if ans_ans_polylines:
+            write_json_output(
+                [
+                    result_folder_path / Path("ans_ans_polylines.json"),
+                    final_folder_path / Path("polylines.json"),
+                ],
+                ans_ans_polylines,
+                self.pretty,
+                compress=True,
+            )
 
-    with open(
-        p.final_folder_path / Path("names.json"), "w", encoding="utf-8"
-    ) as f:
-        json.dump(ans_ans_dict_names, f, ensure_ascii=False, indent=2)
+        # Тот же граф в бинарном CSR - грузится без разбора строк
+        write_csr_graph(
+            ans_ans_dict_graph, result_folder_path / Path("ans_ans_graph.bin")
+        )
+        write_csr_graph(ans_ans_dict_graph, final_folder_path / Path("graph.bin"))
+
+        write_json_output(
+            [
+                result_folder_path / Path("ans_ans_names.json"),
+                final_folder_path / Path("names.json"),
+            ],
+            ans_ans_dict_names,
+            self.pretty,
+            compress=True,
+        )
+        # Индекс для автодополнения по именам (room_search.RoomSearchIndex)
+        write_json_output(
+            [
+                result_folder_path / Path("ans_ans_names_index.json"),
+                final_folder_path / Path("names_index.json"),
+            ],
+            build_search_index(ans_ans_dict_names),
+            self.pretty,
+            compress=True,
+        )
 
+        if stats is not None:
+            stats.lap("write_final")
+            stats.counters.update(
+                {
+                    "floors": len(parts),
+                    "nodes": len(ans_ans_dict_graph),
+                    "links": sum(len(n) for n in ans_ans_dict_graph.values()),
+                    "names": len(ans_ans_dict_names),
+                    "staircase_links": self.staircase_links(),
+                }
+            )
 
-def main():
+        return ans_ans_dict_graph, ans_ans_dict_names, ans_ans_polylines
 
-    svg_paths = [
-        ".\\GB\\GraphBuilder\\svg_parser\\input_images\\floor 6 matmeh.svg",
-        ".\\GB\\GraphBuilder\\svg_parser\\input_images\\floor 5 matmeh.svg",
-        ".\\GB\\GraphBuilder\\svg_parser\\input_images\\floor 1 kuibysheva.svg",
-        ".\\GB\\GraphBuilder\\svg_parser\\input_images\\floor 3 kuibysheva.svg",
-        ".\\GB\\GraphBuilder\\svg_parser\\input_images\\floor 1k kuibysheva.svg",
-        ".\\GB\\GraphBuilder\\svg_parser\\input_images\\floor 2k kuibysheva.svg",
-    ]
 
+def merge_correct_jsons(
+    parsers: List[GraphBuilderSVG],
+    result_folder_path: Path,
+    stats: Optional[BuildStats] = None,
+):
+    """Сливает этажи с нуля; для пересборки одного этажа - GraphMerger.set_floor"""
+    merger = GraphMerger()
+    for p in parsers:
+        merger.set_floor(p)
+    if stats is not None:
+        stats.lap("merge_floors")
+    return merger.write(result_folder_path, stats)
+
+
+SVG_PATHS = [
+    ".\\GB\\GraphBuilder\\svg_parser\\input_images\\floor 6 matmeh.svg",
+    ".\\GB\\GraphBuilder\\svg_parser\\input_images\\floor 5 matmeh.svg",
+    ".\\GB\\GraphBuilder\\svg_parser\\input_images\\floor 1 kuibysheva.svg",
+    ".\\GB\\GraphBuilder\\svg_parser\\input_images\\floor 3 kuibysheva.svg",
+    ".\\GB\\GraphBuilder\\svg_parser\\input_images\\floor 1k kuibysheva.svg",
+    ".\\GB\\GraphBuilder\\svg_parser\\input_images\\floor 2k kuibysheva.svg",
+]
+
+
+_code_hash: Optional[str] = None
+
+
+def _parser_code_hash() -> str:
+    """Хэш исходника парсера: после правок в коде кэш этажей не годится"""
+    global _code_hash
+    if _code_hash is None:
+        _code_hash = hashlib.sha256(Path(__file__).read_bytes()).hexdigest()
+    return _code_hash
+
+
+def evict_stale_cache(cache_folder: Path):
+    """Удаляет записи кэша для svg, которых больше нет"""
+    if not cache_folder.is_dir():
+        return
+    input_folder = cache_folder.parent / "input_images"
+    for cache_path in cache_folder.glob("* *.json"):
+        stem = cache_path.stem.rsplit(" ", 1)[0]
+        if not (input_folder / f"{stem}.svg").exists():
+            os.remove(cache_path)
+
+
+def _build_floor(svg_path: str, options: dict):
+    """Строит один этаж в процессе-воркере
+
+    offset_dict воркера до родителя не доходит, поэтому смещение этажа
+    возвращается вместе с графом.
+    """
+    parser = GraphBuilderSVG(svg_path)
+    for name, value in options.items():
+        setattr(parser, name, value)
+    parser.run()
+    return parser.result()
+
+
+def build_floors(
+    svg_paths: List[str],
+    workers: int = 1,
+    use_cache: bool = True,
+    options: Optional[dict] = None,
+) -> List[GraphBuilderSVG]:
+    """Строит все этажи, при workers > 1 - параллельно в пуле процессов
+
+    options - атрибуты GraphBuilderSVG, которые надо выставить каждому
+    этажу (debug_output, contract_corridors, ...). С use_cache
+    пересобираются только этажи, у которых поменялся svg, настройки
+    парсера или его код; остальные берутся из кэша.
+    """
+    options = options or {}
     parsers = [GraphBuilderSVG(path) for path in svg_paths]
-
     for p in parsers:
-        p.run()
+        for name, value in options.items():
+            setattr(p, name, value)
+    to_build = [p for p in parsers if not (use_cache and p.load_cache())]
+
+    if workers <= 1:
+        for p in to_build:
+            p.run()
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(
+                _build_floor,
+                [p.source_file_path for p in to_build],
+                [options] * len(to_build),
+            )
+            for p, result in zip(to_build, results):
+                p.apply_result(result)
+
+    if use_cache:
+        for p in to_build:
+            p.store_cache()
+        for cache_folder in {p.cache_folder for p in parsers}:
+            evict_stale_cache(cache_folder)
+    return parsers
+
+
+def main(
+    workers: int = 1,
+    use_cache: bool = True,
+    debug_output: bool = False,
+    contract_corridors: bool = False,
+    profile: bool = False,
+    watch_floors: bool = False,
+    snap_tolerance: float = 0.0,
+    pretty_output: bool = False,
+):
+    options = {
+        "debug_output": debug_output,
+        "pretty_output": pretty_output,
+        "snap_tolerance": snap_tolerance,
+        "contract_corridors": contract_corridors,
+        "profile": profile,
+    }
+    parsers = build_floors(SVG_PATHS, workers, use_cache, options)
     print("aboba")
-    merge_correct_jsons(parsers, parsers[0].output_folder_name.parent.parent.parent)
+    result_folder_path = parsers[0].output_folder_name.parent.parent.parent
+    merge_stats = BuildStats("merge") if profile else None
+    merger = GraphMerger(pretty_output)
+    for p in parsers:
+        merger.set_floor(p)
+    if merge_stats is not None:
+        merge_stats.lap("merge_floors")
+    merge_and_route(merger, result_folder_path, merge_stats)
+
+    if merge_stats is not None:
+        tracemalloc.stop()
+        write_build_report(parsers, merge_stats, result_folder_path / Path("build_report.json"))
+
+    if watch_floors:
+        watch(parsers, merger, result_folder_path, options, use_cache)
+
+
+def merge_and_route(
+    merger: GraphMerger,
+    result_folder_path: Path,
+    merge_stats: Optional[BuildStats] = None,
+):
+    """Пишет слитый граф и пересчитывает таблицу маршрутов и надстройку лестниц
+
+    Возвращает то же, что merger.write: граф, имена и ломаные.
+    """
+    ans_ans_graph, ans_ans_dict_names, ans_ans_polylines = merger.write(
+        result_folder_path, merge_stats
+    )
+
+    graph = load_csr_graph(result_folder_path / Path("ans_ans_graph.bin"))
+    edge_lengths = {(pl["from"], pl["to"]): pl["length"] for pl in ans_ans_polylines}
+    build_route_table(
+        graph,
+        ans_ans_dict_names,
+        result_folder_path / Path("ans_ans_routes.npz"),
+        edge_lengths,
+    )
+    if merge_stats is not None:
+        merge_stats.lap("route_table")
+
+    build_stair_overlay(
+        graph,
+        ans_ans_dict_names,
+        result_folder_path / Path("ans_ans_overlay.npz"),
+        edge_lengths,
+    )
+    if merge_stats is not None:
+        merge_stats.lap("stair_overlay")
+    return ans_ans_graph, ans_ans_dict_names, ans_ans_polylines
+
+
+# Как часто проверять svg и сколько ждать тишины после последней записи, с
+WATCH_INTERVAL = 1.0
+WATCH_DEBOUNCE = 0.5
+
+
+def _svg_signature(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def watch(
+    parsers: List[GraphBuilderSVG],
+    merger: GraphMerger,
+    result_folder_path: Path,
+    options: dict,
+    use_cache: bool = True,
+    interval: float = WATCH_INTERVAL,
+    debounce: float = WATCH_DEBOUNCE,
+):
+    """Следит за svg этажей и пересобирает только изменившиеся
+
+    Этаж пересобирается, когда его svg не менялся debounce секунд (экспорт
+    из фигмы пишет файл не за один раз), и сливается с остальными этажами,
+    которые уже лежат в merger: пересчитываются только вклад этажа и его
+    лестницы. Если svg битый или недописан, остается
+    прошлая версия этажа. Выходные файлы подменяются целиком, так что
+    запущенный сервер не прочитает граф наполовину.
+    """
+    signatures = {p.source_file_path: _svg_signature(p.source_file_path) for p in parsers}
+    changed: Dict[str, float] = {}
+    print(f"слежу за {len(parsers)} svg, Ctrl+C - выход")
+
+    while True:
+        time.sleep(interval)
+        now = time.monotonic()
+        for p in parsers:
+            signature = _svg_signature(p.source_file_path)
+            if signature != signatures[p.source_file_path]:
+                signatures[p.source_file_path] = signature
+                changed[p.source_file_path] = now
+
+        rebuilt = False
+        for i, p in enumerate(parsers):
+            path = p.source_file_path
+            if path not in changed or now - changed[path] < debounce:
+                continue
+            if signatures[path] is None:
+                # файл удален или еще не записан заново - ждем
+                continue
+            del changed[path]
+
+            floor_key = f"{p.floor} {p.korpus}"
+            old_offset = offset_dict[floor_key]
+            parser = GraphBuilderSVG(path)
+            for name, value in options.items():
+                setattr(parser, name, value)
+            try:
+                parser.run()
+                if not parser.correct_graph:
+                    raise RuntimeError("в svg нет графа")
+            except Exception as e:
+                offset_dict[floor_key] = old_offset
+                print(f"{floor_key}: не собрался ({e!r}), остается прошлая версия")
+                continue
+
+            if use_cache:
+                parser.store_cache()
+            parsers[i] = parser
+            merger.set_floor(parser)
+            rebuilt = True
+            print(f"{floor_key}: пересобран")
+
+        if rebuilt:
+            merge_and_route(merger, result_folder_path)
+            print("граф обновлен")
+
+
+def write_build_report(
+    parsers: List[GraphBuilderSVG], merge_stats: BuildStats, output_path: Path
+):
+    """Печатает и сохраняет отчет профилирования: по этажу на строку и слияние"""
+    floors = [
+        p.profile_report or {"name": f"{p.floor} {p.korpus}", "cached": True}
+        for p in parsers
+    ]
+    for report in floors:
+        if report.get("cached"):
+            print(f"{report['name']}: из кэша")
+        else:
+            print(format_report(report))
+    print(format_report(merge_stats.report()))
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(
+            {"floors": floors, "merge": merge_stats.report()},
+            f,
+            ensure_ascii=False,
+            indent=2,
+        )
 
 
 if __name__ == "__main__":
-    main()
+    arg_parser = argparse.ArgumentParser(description="Сборка графа навигации из svg")
+    arg_parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="сколько этажей строить параллельно (по умолчанию 1)",
+    )
+    arg_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="пересобрать все этажи, не глядя в кэш",
+    )
+    arg_parser.add_argument(
+        "--debug-output",
+        action="store_true",
+        help="писать промежуточные json каждого этажа",
+    )
+    arg_parser.add_argument(
+        "--pretty",
+        action="store_true",
+        help="писать json с отступами (по умолчанию - в одну строку)",
+    )
+    arg_parser.add_argument(
+        "--snap",
+        type=float,
+        default=0.0,
+        metavar="TOL",
+        help="сливать концы путей ближе TOL px и резать ребра в Т-стыках",
+    )
+    arg_parser.add_argument(
+        "--contract",
+        action="store_true",
+        help="схлопнуть цепочки коридорных вершин степени 2 перед экспортом",
+    )
+    arg_parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="замерить время, память и счетчики стадий (build_report.json)",
+    )
+    arg_parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="после сборки следить за svg и пересобирать изменившиеся этажи",
+    )
+    args = arg_parser.parse_args()
+    main(
+        workers=args.workers,
+        use_cache=not args.no_cache,
+        debug_output=args.debug_output,
+        contract_corridors=args.contract,
+        profile=args.profile,
+        watch_floors=args.watch,
+        snap_tolerance=args.snap,
+        pretty_output=args.pretty,
+    )
 
 
 """
@@ -0,0 +1,47 @@
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+# svg_parser и соседние модули лежат не в пакете, а рядом со скриптом
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import svg_parser as sp  # noqa: E402
+
+
+INPUT_IMAGES = Path(__file__).resolve().parent.parent / "svg_parser" / "input_images"
+FLOORS = [
+    "floor 6 matmeh",
+    "floor 5 matmeh",
+    "floor 1 kuibysheva",
+    "floor 3 kuibysheva",
+    "floor 1k kuibysheva",
+    "floor 2k kuibysheva",
+]
+
+
+def build(root: Path, floor: str) -> sp.GraphBuilderSVG:
+    p = sp.GraphBuilderSVG(str(root / "svg_parser" / "input_images" / f"{floor}.svg"))
+    p.run()
+    p.final_folder_path = root / "final"
+    return p
+
+
+@pytest.fixture(scope="module")
+def root(tmp_path_factory):
+    """Копия input_images во временной папке: сборка пишет рядом со svg"""
+    root = tmp_path_factory.mktemp("floors")
+    shutil.copytree(INPUT_IMAGES, root / "svg_parser" / "input_images")
+    (root / "final").mkdir()
+    return root
+
+
+@pytest.fixture(scope="module")
+def build_floor(root):
+    return lambda floor: build(root, floor)
+
+
+@pytest.fixture(scope="module")
+def parsers(build_floor):
+    return [build_floor(floor) for floor in FLOORS]
@@ -0,0 +1,34 @@
+import shutil
+from pathlib import Path
+
+import svg_parser as sp
+from conftest import INPUT_IMAGES
+
+
+FLOOR = "floor 6 matmeh"
+
+
+def build(root: Path, **options):
+    paths = [str(root / "svg_parser" / "input_images" / f"{FLOOR}.svg")]
+    return sp.build_floors(paths, options=options)[0]
+
+
+def test_broken_cache_entry_is_a_miss(tmp_path):
+    shutil.copytree(INPUT_IMAGES, tmp_path / "svg_parser" / "input_images")
+    expected = build(tmp_path).result()
+
+    (entry,) = (tmp_path / "svg_parser" / ".build_cache").glob(f"{FLOOR} *.json")
+    entry.write_bytes(entry.read_bytes()[:100])
+    p = sp.GraphBuilderSVG(str(tmp_path / "svg_parser" / "input_images" / f"{FLOOR}.svg"))
+    assert not p.load_cache()
+
+    assert build(tmp_path).result() == expected
+    assert p.load_cache()
+
+
+def test_debug_output_bypasses_cache(tmp_path):
+    shutil.copytree(INPUT_IMAGES, tmp_path / "svg_parser" / "input_images")
+    build(tmp_path)
+    p = build(tmp_path, debug_output=True)
+    assert Path(p.graph_json_path).exists()
+    assert Path(p.stupid_json_path).exists()
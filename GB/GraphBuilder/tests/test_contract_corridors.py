@@ -0,0 +1,36 @@
+import svg_parser as sp
+
+
+# кабинет 701 ближе всего к вершине 200 0, у которой два соседа: при привязке
+# она удаляется, а ребро к ней от 200 100 остается живым
+FLOOR_SVG = """<svg xmlns="http://www.w3.org/2000/svg">
+<g id="floor7 matmeh">
+<path id="graph 1" d="M0 0H100H200V100H300V200"/>
+<g id="room_ids">
+<text id="701" transform="translate(205 5)">701</text>
+</g>
+</g>
+</svg>
+"""
+
+
+def test_contraction_skips_removed_room_stub(tmp_path):
+    images = tmp_path / "svg_parser" / "input_images"
+    images.mkdir(parents=True)
+    (images / "floor 7 matmeh.svg").write_text(FLOOR_SVG, encoding="utf-8")
+    (tmp_path / "final").mkdir()
+
+    p = sp.GraphBuilderSVG(str(images / "floor 7 matmeh.svg"))
+    p.contract_corridors = True
+    p.run()
+    p.final_folder_path = tmp_path / "final"
+    graph, names, polylines = sp.merge_correct_jsons([p], tmp_path)
+
+    assert set(names) == {"701"}
+    assert names["701"] in graph
+    removed = "200 0 matmeh_7"
+    assert removed not in graph
+    assert all(removed not in neighbours for neighbours in graph.values())
+    assert all(
+        removed not in [pl["from"], pl["to"]] + pl["points"] for pl in polylines
+    )
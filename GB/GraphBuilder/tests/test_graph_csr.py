@@ -0,0 +1,33 @@
+import json
+from pathlib import Path
+
+from graph_csr import load_csr_graph, write_csr_graph
+
+
+GRAPH_JSON = Path(__file__).resolve().parent.parent / "ans_ans_graph.json"
+
+
+def test_roundtrip_matches_json(tmp_path):
+    with open(GRAPH_JSON, encoding="utf-8") as f:
+        graph = json.load(f)
+
+    write_csr_graph(graph, tmp_path / "graph.bin")
+    csr = load_csr_graph(tmp_path / "graph.bin")
+
+    assert len(csr) == len(graph)
+    assert csr.to_dict() == graph
+
+
+def test_coordinates_and_floors(tmp_path):
+    graph = {
+        "10 20 matmeh_6": ["30 20 matmeh_6", "10 20 matmeh_5"],
+        "30 20 matmeh_6": ["10 20 matmeh_6"],
+        "10 20 matmeh_5": ["10 20 matmeh_6"],
+    }
+    write_csr_graph(graph, tmp_path / "graph.bin")
+    csr = load_csr_graph(tmp_path / "graph.bin")
+
+    i = csr.index_of("10 20 matmeh_5")
+    assert csr.coords[i].tolist() == [10.0, 20.0]
+    assert csr.floors[csr.floor_codes[i]] == "matmeh_5"
+    assert [csr.node_id(n) for n in csr.neighbours_of(0)] == graph["10 20 matmeh_6"]
@@ -0,0 +1,61 @@
+from pathlib import Path
+
+import svg_parser as sp
+
+
+OUTPUTS = [
+    "ans_ans_graph.json",
+    "ans_ans_names.json",
+    "ans_ans_graph.bin",
+    "final/graph.json",
+    "final/names.json",
+    "final/graph.bin",
+    "svg_parser/ans_graph.json",
+    "svg_parser/ans_names.json",
+]
+
+
+def outputs(folder: Path):
+    return {name: (folder / name).read_bytes() for name in OUTPUTS}
+
+
+def merged(root: Path, merger: sp.GraphMerger):
+    merger.write(root)
+    return outputs(root)
+
+
+def test_replaced_floor_matches_full_merge(root, parsers, build_floor):
+    sp.merge_correct_jsons(parsers, root)
+    full = outputs(root)
+
+    merger = sp.GraphMerger()
+    for p in parsers:
+        merger.set_floor(p)
+    assert merged(root, merger) == full
+
+    # пересобранный этаж встает на свое место, лестницы перелинковываются
+    for floor in ["floor 5 matmeh", "floor 1 kuibysheva", "floor 2k kuibysheva"]:
+        merger.set_floor(build_floor(floor))
+        assert merged(root, merger) == full
+
+
+def test_removed_floor_matches_merge_without_it(root, parsers):
+    rest = [p for p in parsers if f"{p.floor} {p.korpus}" != "5 matmeh"]
+    sp.merge_correct_jsons(rest, root)
+    without = outputs(root)
+
+    merger = sp.GraphMerger()
+    for p in parsers:
+        merger.set_floor(p)
+    merger.remove_floor("5 matmeh")
+    assert merged(root, merger) == without
+    assert all(
+        stair[2] != "matmeh" or len(ends) == 1 for stair, ends in merger.stairs.items()
+    )
+
+
+def test_merge_does_not_touch_parsers(root, parsers):
+    before = [dict(p.correct_graph) for p in parsers]
+    sp.merge_correct_jsons(parsers, root)
+    sp.merge_correct_jsons(parsers, root)
+    assert [dict(p.correct_graph) for p in parsers] == before
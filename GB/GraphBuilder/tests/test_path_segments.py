@@ -0,0 +1,47 @@
+import pytest
+
+from svg_parser import parse_path_segments
+
+
+def segments(path_data, x_offset=0.0, y_offset=0.0):
+    return list(parse_path_segments(path_data, x_offset, y_offset))
+
+
+def test_absolute_commands_with_offset():
+    assert segments("M10 20L30 20V40H10Z", 100, 1000) == [
+        110, 1020, 130, 1020,
+        130, 1020, 130, 1040,
+        130, 1040, 110, 1040,
+        110, 1040, 110, 1020,
+    ]
+
+
+def test_leading_relative_move_keeps_offset():
+    assert segments("m10 20l20 0", 100, 1000) == [110, 1020, 130, 1020]
+    assert segments("m10 20 20 0v5z", 100, 1000) == [
+        110, 1020, 130, 1020,
+        130, 1020, 130, 1025,
+        130, 1025, 110, 1020,
+    ]
+
+
+def test_relative_commands():
+    assert segments("M10 10l5 0h5v5l-10 0z") == [
+        10, 10, 15, 10,
+        15, 10, 20, 10,
+        20, 10, 20, 15,
+        20, 15, 10, 15,
+        10, 15, 10, 10,
+    ]
+
+
+def test_exponents_and_glued_numbers():
+    assert segments("M1e1,2E1L-5-5") == [10, 20, -5, -5]
+    assert segments("M.5.5L1.5-.5") == [0.5, 0.5, 1.5, -0.5]
+    assert segments("M0 0l1e-1+2e+0") == pytest.approx([0, 0, 0.1, 2])
+
+
+def test_curves_and_arcs_end_at_their_last_point():
+    assert segments("M0 0C1 1 2 2 3 3q1 1 2 0") == [0, 0, 3, 3, 3, 3, 5, 3]
+    # флаги дуги записаны слитно с координатой
+    assert segments("M0 0a10 10 0 015 5A1 1 0 1 0 20 20") == [0, 0, 5, 5, 5, 5, 20, 20]
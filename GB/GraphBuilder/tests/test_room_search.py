@@ -0,0 +1,50 @@
+from room_search import RoomSearchIndex, build_search_index, normalize_name
+
+
+NAMES = [
+    "524а",
+    "524б",
+    "525",
+    "деканат матмех",
+    "кафедра алгебры",
+    "читальный зал",
+    "Ёлка",
+]
+
+
+def index() -> RoomSearchIndex:
+    return RoomSearchIndex(build_search_index(NAMES))
+
+
+def test_normalize_name():
+    # латинская a -> кириллическая а, ё -> е, знаки -> пробел
+    assert normalize_name("524a") == "524а"
+    assert normalize_name(" Ёлка-2 ") == "елка 2"
+
+
+def test_prefix():
+    assert index().prefix("524") == ["524а", "524б"]
+    assert index().prefix("524a") == ["524а"]
+    # по началу любого слова имени
+    assert index().prefix("матм") == ["деканат матмех"]
+    assert index().prefix("елк") == ["Ёлка"]
+    assert index().prefix("524", limit=1) == ["524а"]
+
+
+def test_fuzzy():
+    assert index().fuzzy("деканат")[0] == ("деканат матмех", 1.0)
+    assert index().fuzzy("диканат")[0][0] == "деканат матмех"
+    assert index().fuzzy("читальнй зал")[0][0] == "читальный зал"
+    assert index().fuzzy("xyz") == []
+
+
+def test_search_prefix_first():
+    assert index().search("524a")[0] == "524а"
+    assert index().search("диканат") == ["деканат матмех"]
+
+
+def test_empty_query():
+    assert index().prefix("") == []
+    assert index().fuzzy("") == []
+    assert index().search("") == []
+    assert index().search(" - ") == []
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+from scipy.sparse.csgraph import dijkstra
+
+import svg_parser as sp
+from graph_csr import load_csr_graph, write_csr_graph
+from route_table import FLOOR_CHANGE_COST, weighted_adjacency
+from stair_overlay import StairOverlay, build_stair_overlay
+
+
+def flat_distances(graph, names, rooms, edge_lengths=None):
+    """Дейкстра по всему графу здания - с чем сравнивается надстройка"""
+    room_node = [graph.index_of(names[room]) for room in rooms]
+    dist = dijkstra(weighted_adjacency(graph, edge_lengths), indices=room_node)
+    return dist[:, room_node]
+
+
+def overlay_distances(overlay, rooms):
+    return np.array([[overlay.distance(a, b) for b in rooms] for a in rooms])
+
+
+@pytest.fixture(scope="module")
+def merged(root, parsers):
+    merger = sp.GraphMerger()
+    for p in parsers:
+        merger.set_floor(p)
+    _, names, polylines = sp.merge_and_route(merger, root)
+    edge_lengths = {(pl["from"], pl["to"]): pl["length"] for pl in polylines}
+    return root, names, edge_lengths
+
+
+def test_overlay_matches_flat_dijkstra(merged):
+    root, names, edge_lengths = merged
+    graph = load_csr_graph(root / "ans_ans_graph.bin")
+    overlay = StairOverlay(root / "ans_ans_overlay.npz")
+    rooms = overlay.rooms
+    assert sorted(rooms) == sorted(names)
+
+    expected = flat_distances(graph, names, rooms, edge_lengths)
+    got = overlay_distances(overlay, rooms)
+    assert np.array_equal(np.isinf(got), np.isinf(expected))
+    assert np.allclose(got[np.isfinite(got)], expected[np.isfinite(expected)], rtol=1e-5)
+    # между этажами здания путь есть, иначе надстройка ничего не проверяет
+    floors = overlay.room_floor
+    assert any(
+        np.isfinite(got[i, j]) and floors[i] != floors[j]
+        for i in range(len(rooms))
+        for j in range(len(rooms))
+    )
+
+
+def test_route_through_other_floor(tmp_path):
+    # на этаже 1 между кабинетами крюк, быстрее спуститься и пройти по этажу 0
+    graph = {
+        "0 0 k_1": ["500 1000 k_1", "0 10 k_1"],
+        "500 1000 k_1": ["0 0 k_1", "1000 0 k_1"],
+        "1000 0 k_1": ["500 1000 k_1", "1000 10 k_1"],
+        "0 10 k_1": ["0 0 k_1", "0 10 k_0"],
+        "1000 10 k_1": ["1000 0 k_1", "1000 10 k_0"],
+        "0 10 k_0": ["0 10 k_1", "1000 10 k_0", "0 50 k_0"],
+        "1000 10 k_0": ["1000 10 k_1", "0 10 k_0"],
+        "0 50 k_0": ["0 10 k_0"],
+        "5 5 k_2": [],
+    }
+    names = {"a": "0 0 k_1", "b": "1000 0 k_1", "c": "0 50 k_0", "d": "5 5 k_2"}
+    write_csr_graph(graph, tmp_path / "graph.bin")
+    csr = load_csr_graph(tmp_path / "graph.bin")
+    build_stair_overlay(csr, names, tmp_path / "overlay.npz")
+    overlay = StairOverlay(tmp_path / "overlay.npz")
+
+    distance, portals = overlay.query("a", "b")
+    assert distance == pytest.approx(10 + FLOOR_CHANGE_COST + 1000 + FLOOR_CHANGE_COST + 10)
+    assert [csr.node_id(i) for i in portals] == [
+        "0 10 k_1",
+        "0 10 k_0",
+        "1000 10 k_0",
+        "1000 10 k_1",
+    ]
+    assert overlay.distance("a", "c") == pytest.approx(10 + FLOOR_CHANGE_COST + 40)
+    assert overlay.distance("d", "a") == float("inf")
+    assert overlay.query("d", "d") == (0.0, [])
+
+    rooms = overlay.rooms
+    expected = flat_distances(csr, names, rooms)
+    assert np.allclose(overlay_distances(overlay, rooms), expected, rtol=1e-5)
@@ -0,0 +1,86 @@
+"""Ускорение параллельного подсчета metric.txt в зависимости от числа процессов
+
+Запуск: python MetricsLoader/benchmarks/bench_parallel.py [--records 5000000] [--json results.json]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from metrics_loader import count_good_bad, count_parallel, iter_records  # noqa: E402
+
+
+def write_metric_file(path: Path, records: int, seed: int = 0):
+    """Записи в формате AsyncWriter: ";<startedAt> <activeMs>" """
+    rnd = random.Random(seed)
+    with open(path, "w") as f:
+        batch = []
+        for _ in range(records):
+            batch.append(
+                f";2025-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d}T"
+                f"{rnd.randint(0, 23):02d}:{rnd.randint(0, 59):02d}:{rnd.randint(0, 59):02d}"
+                f".{rnd.randint(0, 999):03d}Z {rnd.randint(1000, 400000)}"
+            )
+            if len(batch) == 100000:
+                f.write("".join(batch))
+                batch = []
+        f.write("".join(batch))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--json", help="куда записать результаты")
+    arg_parser.add_argument("--records", type=int, default=5000000)
+    arg_parser.add_argument(
+        "--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16]
+    )
+    args = arg_parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "metric.txt"
+        write_metric_file(path, args.records)
+        size = os.path.getsize(path)
+
+        start = time.perf_counter()
+        with open(path) as f:
+            expected = count_good_bad(iter_records(f))
+        sequential = time.perf_counter() - start
+        print(f"sequential {sequential:8.3f} s ({size / 2 ** 20:.0f} MiB)")
+
+        for workers in args.workers:
+            start = time.perf_counter()
+            result = count_parallel(str(path), workers)
+            elapsed = time.perf_counter() - start
+            if result != expected or list(result) != list(expected):
+                raise RuntimeError(f"parallel result differs with {workers} workers")
+
+            results.append(
+                {
+                    "workers": workers,
+                    "records": args.records,
+                    "file_bytes": size,
+                    "sequential_seconds": round(sequential, 4),
+                    "parallel_seconds": round(elapsed, 4),
+                    "speedup": round(sequential / elapsed, 2),
+                }
+            )
+            print(
+                f"{workers:>4} workers {elapsed:8.3f} s "
+                f"x{results[-1]['speedup']:.2f} (cpu {os.cpu_count()})"
+            )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
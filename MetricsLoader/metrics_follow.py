@@ -0,0 +1,232 @@
+"""Слежение за metric.txt в реальном времени: доля хороших и перцентили за 1/5/60 минут
+
+Файл опрашивается раз в --interval секунд, читаются только новые байты.
+Записи раскладываются по корзинам в кольцевом буфере по времени прихода
+(часы клиента в startedAt для живого окна ненадежны), поэтому память не
+растет: буфер покрывает самое длинное окно, старые корзины затираются.
+
+Запуск: python MetricsLoader/metrics_follow.py [metric.txt] [--every 10] [--output snapshot.json]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from metrics_loader import GOOD_MAX, GOOD_MIN, METRIC_PATH, PERCENTILES
+from metrics_rollup import BINS, histogram_percentiles, latency_bins
+
+WINDOWS_MINUTES = (1, 5, 60)
+BUCKET_SECONDS = 10
+READ_BYTES = 1 << 20
+
+
+class RollingWindows:
+    """Кольцевой буфер корзин по BUCKET_SECONDS секунд на самое длинное окно"""
+
+    def __init__(
+        self,
+        windows_minutes: Sequence[int] = WINDOWS_MINUTES,
+        bucket_seconds: int = BUCKET_SECONDS,
+        good_min: int = GOOD_MIN,
+        good_max: int = GOOD_MAX,
+    ):
+        self.windows_minutes = tuple(windows_minutes)
+        self.bucket_seconds = bucket_seconds
+        self.good_min = good_min
+        self.good_max = good_max
+
+        size = max(self.windows_minutes) * 60 // bucket_seconds
+        # номер корзины (время // bucket_seconds), которая сейчас лежит в слоте
+        self.slot_bucket = np.full(size, -1, np.int64)
+        self.count = np.zeros(size, np.int64)
+        self.good = np.zeros(size, np.int64)
+        self.min = np.zeros(size, np.int64)
+        self.max = np.zeros(size, np.int64)
+        self.hist = np.zeros((size, BINS), np.int64)
+
+    def _slot(self, now: float) -> int:
+        bucket = int(now // self.bucket_seconds)
+        slot = bucket % len(self.slot_bucket)
+        if self.slot_bucket[slot] != bucket:
+            self.slot_bucket[slot] = bucket
+            self.count[slot] = self.good[slot] = 0
+            self.min[slot] = np.iinfo(np.int64).max
+            self.max[slot] = np.iinfo(np.int64).min
+            self.hist[slot] = 0
+        return slot
+
+    def add(self, now: float, times: np.ndarray):
+        if len(times) == 0:
+            return
+        slot = self._slot(now)
+        self.count[slot] += len(times)
+        self.good[slot] += int(((times >= self.good_min) & (times <= self.good_max)).sum())
+        self.min[slot] = min(self.min[slot], int(times.min()))
+        self.max[slot] = max(self.max[slot], int(times.max()))
+        self.hist[slot] += np.bincount(latency_bins(times), minlength=BINS)
+
+    def snapshot(self, now: float) -> Dict[str, dict]:
+        bucket = int(now // self.bucket_seconds)
+        windows = {}
+        for minutes in self.windows_minutes:
+            buckets = minutes * 60 // self.bucket_seconds
+            live = (self.slot_bucket > bucket - buckets) & (self.slot_bucket <= bucket)
+            count = int(self.count[live].sum())
+            window = {"count": count, "good": int(self.good[live].sum())}
+            if count:
+                low, high = int(self.min[live].min()), int(self.max[live].max())
+                estimates = histogram_percentiles(self.hist[live].sum(axis=0)[None, :])[0]
+                window["good_pct"] = round(window["good"] / count * 100, 2)
+                window["min"] = low
+                for p, value in zip(PERCENTILES, np.clip(estimates, low, high)):
+                    window[f"p{p}"] = round(float(value), 1)
+                window["max"] = high
+            windows[f"{minutes}m"] = window
+        return windows
+
+
+class MetricTail:
+    """Новые записи файла; ротацию и обрезку переживает, начиная файл заново"""
+
+    def __init__(self, path: str, from_start: bool = False):
+        self.path = path
+        self.offset = 0
+        self.inode: Optional[int] = None
+        self.pending = b""
+        self.malformed = 0
+        # прочитано всё, что было в файле - можно спать до следующего опроса
+        self.caught_up = True
+        if not from_start and os.path.exists(path):
+            stat = os.stat(path)
+            self.offset, self.inode = stat.st_size, stat.st_ino
+
+    def read(self) -> List[str]:
+        """Целые записи, дописанные с прошлого вызова
+
+        Запись после последней ";" ждет следующей ";" или, если за целый
+        опрос не изменилась, считается дописанной (AsyncWriter пишет запись
+        одним вызовом).
+        """
+        if not os.path.exists(self.path):
+            return []
+        stat = os.stat(self.path)
+        if stat.st_size < self.offset + len(self.pending) or (
+            self.inode is not None and stat.st_ino and stat.st_ino != self.inode
+        ):
+            self.offset, self.pending = 0, b""
+        self.inode = stat.st_ino
+
+        with open(self.path, "rb") as f:
+            f.seek(self.offset + len(self.pending))
+            data = f.read(READ_BYTES)
+        self.caught_up = len(data) < READ_BYTES
+
+        if not data:
+            if not self.pending:
+                return []
+            # хвост не менялся целый опрос - запись дописана
+            data, self.pending = self.pending, b""
+            self.offset += len(data)
+            return [r for r in data.decode("utf-8").split(";") if r]
+
+        data = self.pending + data
+        cut = data.rfind(b";")
+        if cut < 0:
+            self.pending = data
+            return []
+        self.pending = data[cut:]
+        self.offset += cut
+        return [r for r in data[:cut].decode("utf-8").split(";") if r]
+
+    def parse_times(self, records: List[str]) -> np.ndarray:
+        times = []
+        for data in records:
+            parts = data.split()
+            if len(parts) != 2 or not parts[1].isdigit():
+                self.malformed += 1
+                continue
+            times.append(int(parts[1]))
+        return np.array(times, dtype=np.int64)
+
+
+def write_snapshot(snapshot: dict, output: Optional[str]):
+    if output is None:
+        print(json.dumps(snapshot, ensure_ascii=False), flush=True)
+        return
+    tmp_path = output + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, output)
+
+
+async def follow(
+    path: str = METRIC_PATH,
+    interval: float = 1.0,
+    every: float = 10.0,
+    output: Optional[str] = None,
+    windows: Optional[RollingWindows] = None,
+    from_start: bool = False,
+    duration: Optional[float] = None,
+):
+    """Читает новые записи раз в interval и пишет снимок окон раз в every секунд"""
+    windows = windows or RollingWindows()
+    tail = MetricTail(path, from_start)
+    started = time.monotonic()
+    next_snapshot = started + every
+
+    while duration is None or time.monotonic() - started < duration:
+        records = await asyncio.to_thread(tail.read)
+        windows.add(time.time(), tail.parse_times(records))
+
+        if time.monotonic() >= next_snapshot:
+            next_snapshot += every
+            snapshot = {
+                "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "malformed": tail.malformed,
+                "windows": windows.snapshot(time.time()),
+            }
+            write_snapshot(snapshot, output)
+        if tail.caught_up:
+            await asyncio.sleep(interval)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Живые окна по metric.txt")
+    arg_parser.add_argument("path", nargs="?", default=METRIC_PATH)
+    arg_parser.add_argument("--interval", type=float, default=1.0, help="опрос файла, с")
+    arg_parser.add_argument("--every", type=float, default=10.0, help="снимок, с")
+    arg_parser.add_argument("--output", help="json со снимком вместо stdout")
+    arg_parser.add_argument("--from-start", action="store_true", help="учесть и старые записи")
+    arg_parser.add_argument("--good-min", type=int, default=GOOD_MIN)
+    arg_parser.add_argument("--good-max", type=int, default=GOOD_MAX)
+    arg_parser.add_argument(
+        "--windows", type=int, nargs="+", default=list(WINDOWS_MINUTES), help="окна, мин"
+    )
+    arg_parser.add_argument("--duration", type=float, help="остановиться через столько секунд")
+    args = arg_parser.parse_args()
+
+    windows = RollingWindows(args.windows, BUCKET_SECONDS, args.good_min, args.good_max)
+    try:
+        asyncio.run(
+            follow(
+                args.path,
+                args.interval,
+                args.every,
+                args.output,
+                windows,
+                args.from_start,
+                args.duration,
+            )
+        )
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,40 +1,447 @@
-loaded = ""
-with open("metric.txt", "r") as file:
-    loaded = file.read()
-result = {}
-for data in loaded.split(";"):
-    if data == "":
-        continue
-    date, time = data.split()
-    day, start_time = date.split("T")
-
-    is_good = False
-
-    if 50000 <= int(time) <= 180000:
-        is_good = True
-
-    if day in result.keys():
-        if is_good:
-            result[day]["good"] += 1
-        else:
-            result[day]["bad"] += 1
-    else:
-        result[day] = {"good": 0, "bad": 0}
+import argparse
+import copy
+import hashlib
+import json
+import mmap
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, TextIO, Tuple
+
+import numpy as np
+import pandas as pd
+
+METRIC_PATH = "metric.txt"
+CHUNK_SIZE = 1 << 16
+# Сколько записей pandas разбирает за раз в load_frame
+FRAME_CHUNK_RECORDS = 1 << 20
+
+# Границы "хорошего" времени, мс
+GOOD_MIN = 50000
+GOOD_MAX = 180000
+
+PERCENTILES = (50, 90, 95, 99)
+
+# Примерный размер куска файла для одного воркера в параллельном режиме
+RANGE_BYTES = 32 << 20
+
+# Сколько первых байт файла хэшируется, чтобы заметить перезапись файла
+STATE_HEAD_BYTES = 4096
+
+
+def iter_records(file: TextIO, chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """Записи "дата время" из файла по кусочкам, без чтения файла целиком
+
+    Запись, разрезанная границей куска, доклеивается из следующего куска.
+    """
+    tail = ""
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        parts = (tail + chunk).split(";")
+        tail = parts.pop()
+        for data in parts:
+            if data != "":
+                yield data
+    if tail != "":
+        yield tail
+
+
+def count_good_bad(
+    records: Iterator[str],
+    good_min: int = GOOD_MIN,
+    good_max: int = GOOD_MAX,
+    result: Optional[Dict[str, Dict[str, int]]] = None,
+) -> Dict[str, Dict[str, int]]:
+    """Счетчики good/bad по дням; с result - досчитывает в уже готовые"""
+    if result is None:
+        result = {}
+    for data in records:
+        date, time = data.split()
+        day, start_time = date.split("T")
+
+        is_good = False
+
+        if good_min <= int(time) <= good_max:
+            is_good = True
+
+        if day not in result:
+            result[day] = {"good": 0, "bad": 0}
         if is_good:
             result[day]["good"] += 1
         else:
             result[day]["bad"] += 1
-print(result)
-allgood = 0
-allbad = 0
-for date in result.keys():
-    if result[date]['bad'] == 0:
-        if result[date]['good'] == 0:
-            print(date, "нет данных")
+    return result
+
+
+def print_report(result: Dict[str, Dict[str, int]]):
+    print(result)
+    allgood = 0
+    allbad = 0
+    for date in result.keys():
+        if result[date]['bad'] == 0:
+            if result[date]['good'] == 0:
+                print(date, "нет данных")
+            else:
+                print(date, "100%")
+            continue
+        allgood += result[date]['good']
+        allbad += result[date]['bad']
+        res = round((result[date]['good']/(result[date]['bad'] + result[date]['good'])) * 100, 2)
+        print(date, f"{res}%")
+
+
+def _split_started_at(started_at: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """День (строкой) и час записи из "YYYY-MM-DDTHH:..."
+
+    Обычно время в iso и день - первые 10 байт, тогда всё считается на
+    массивах байт; иначе - медленно, строковыми методами pandas.
+    """
+    stamp = started_at.to_numpy().astype("S13")
+    chars = stamp.view(np.uint8).reshape(-1, 13)
+    if (chars[:, 10] == ord("T")).all() and (chars[:, 12] != 0).all():
+        day = stamp.astype("S10").astype(str)
+        hour = (chars[:, 11] - ord("0")) * 10 + (chars[:, 12] - ord("0"))
+        return day, hour.astype(np.int8)
+    parts = started_at.str.partition("T")
+    hour = parts[2].str.extract(r"^(\d+)", expand=False).astype(np.int8)
+    return parts[0].to_numpy().astype(str), hour.to_numpy()
+
+
+def load_frame(path: str, chunk_records: int = FRAME_CHUNK_RECORDS) -> pd.DataFrame:
+    """Все записи файла как таблица day, hour, time
+
+    Разбор идет сишным парсером pandas (записи разделены ";", поля пробелом)
+    кусками по chunk_records записей; в памяти остаются только номер дня,
+    час и время. Дни в категориях идут в порядке появления в файле.
+    """
+    days: Dict[str, int] = {}
+    codes, hours, times = [], [], []
+    for chunk in pd.read_csv(
+        path,
+        sep=" ",
+        lineterminator=";",
+        header=None,
+        names=["started_at", "time"],
+        dtype={"started_at": str, "time": np.int64},
+        chunksize=chunk_records,
+    ):
+        day, hour = _split_started_at(chunk["started_at"])
+        local_codes, uniques = pd.factorize(day)
+        lookup = np.array([days.setdefault(str(d), len(days)) for d in uniques], dtype=np.int32)
+        codes.append(lookup[local_codes])
+        hours.append(hour)
+        times.append(chunk["time"].to_numpy())
+
+    def join(arrays, dtype):
+        return np.concatenate(arrays) if arrays else np.empty(0, dtype=dtype)
+
+    return pd.DataFrame(
+        {
+            "day": pd.Categorical.from_codes(join(codes, np.int32), categories=list(days)),
+            "hour": join(hours, np.int8),
+            "time": join(times, np.int64),
+        }
+    )
+
+
+def good_bad_from_frame(
+    frame: pd.DataFrame, good_min: int = GOOD_MIN, good_max: int = GOOD_MAX
+) -> Dict[str, Dict[str, int]]:
+    """То же, что count_good_bad, но по таблице; дни в порядке появления"""
+    good = frame["time"].between(good_min, good_max)
+    counts = good.groupby(frame["day"], observed=True, sort=False).agg(["sum", "size"])
+    return {
+        day: {"good": int(row["sum"]), "bad": int(row["size"] - row["sum"])}
+        for day, row in counts.iterrows()
+    }
+
+
+def latency_stats(
+    frame: pd.DataFrame, by, good_min: int = GOOD_MIN, good_max: int = GOOD_MAX
+) -> pd.DataFrame:
+    """Число записей, доля хороших, min/max и перцентили времени по группам by"""
+    columns = (
+        ["count", "good", "bad", "good_pct", "min"]
+        + [f"p{p}" for p in PERCENTILES]
+        + ["max"]
+    )
+    if frame.empty:
+        # пустой metric.txt после деплоя - пустой отчет с теми же колонками
+        if isinstance(by, str):
+            index = pd.Index([], name=by)
         else:
-            print(date, "100%")
-        continue
-    allgood += result[date]['good']
-    allbad += result[date]['bad']
-    res = round((result[date]['good']/(result[date]['bad'] + result[date]['good'])) * 100, 2)
-    print(date, f"{res}%")
\ No newline at end of file
+            index = pd.MultiIndex.from_arrays([[] for _ in by], names=by)
+        return pd.DataFrame(columns=columns, index=index)
+    frame = frame.assign(good=frame["time"].between(good_min, good_max))
+    groups = frame.groupby(by, observed=True)
+    stats = groups["time"].agg(["count", "min", "max"])
+    stats["good"] = groups["good"].sum()
+    stats["bad"] = stats["count"] - stats["good"]
+    stats["good_pct"] = (stats["good"] / stats["count"] * 100).round(2)
+    quantiles = groups["time"].quantile([p / 100 for p in PERCENTILES]).unstack()
+    quantiles.columns = [f"p{p}" for p in PERCENTILES]
+    stats = stats.join(quantiles)
+    return stats[columns]
+
+
+def latency_report(
+    frame: pd.DataFrame, good_min: int = GOOD_MIN, good_max: int = GOOD_MAX
+) -> Dict[str, pd.DataFrame]:
+    return {
+        "days": latency_stats(frame, "day", good_min, good_max),
+        "hours": latency_stats(frame, ["day", "hour"], good_min, good_max),
+    }
+
+
+def write_report_json(report: Dict[str, pd.DataFrame], path: str, good_min: int, good_max: int):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "good_min": good_min,
+                "good_max": good_max,
+                "days": json.loads(report["days"].reset_index().to_json(orient="records")),
+                "hours": json.loads(report["hours"].reset_index().to_json(orient="records")),
+            },
+            f,
+            ensure_ascii=False,
+            indent=2,
+        )
+
+
+def write_report_csv(report: Dict[str, pd.DataFrame], path: str):
+    """Одна таблица: строки по дням (hour пустой) и по часам"""
+    days = report["days"].reset_index().assign(hour=None)
+    hours = report["hours"].reset_index()
+    table = pd.concat([days, hours], ignore_index=True)[hours.columns]
+    table["hour"] = table["hour"].astype("Int8")
+    table.sort_values(["day", "hour"], kind="stable", na_position="first").to_csv(
+        path, index=False
+    )
+
+
+def split_ranges(path: str, parts: int) -> List[Tuple[int, int]]:
+    """Делит файл на parts кусков, каждый начинается с ";" (кроме первого)"""
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        bounds = [0]
+        for i in range(1, parts):
+            pos = mm.find(b";", max(size * i // parts, bounds[-1] + 1))
+            if pos < 0:
+                break
+            bounds.append(pos)
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if a < b]
+
+
+def _count_range(
+    path: str, start: int, end: int, good_min: int, good_max: int
+) -> Dict[str, Dict[str, int]]:
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        data = mm[start:end].decode("utf-8")
+    return count_good_bad(
+        (r for r in data.split(";") if r != ""), good_min, good_max
+    )
+
+
+def merge_results(
+    parts: List[Dict[str, Dict[str, int]]]
+) -> Dict[str, Dict[str, int]]:
+    """Складывает счетчики кусков по порядку - дни идут как в файле"""
+    result = {}
+    for part in parts:
+        for day, counts in part.items():
+            if day not in result:
+                result[day] = {"good": 0, "bad": 0}
+            result[day]["good"] += counts["good"]
+            result[day]["bad"] += counts["bad"]
+    return result
+
+
+def count_parallel(
+    path: str,
+    workers: Optional[int] = None,
+    good_min: int = GOOD_MIN,
+    good_max: int = GOOD_MAX,
+) -> Dict[str, Dict[str, int]]:
+    """То же, что count_good_bad по всему файлу, но кусками в пуле процессов"""
+    workers = workers or os.cpu_count() or 1
+    parts = max(workers * 4, os.path.getsize(path) // RANGE_BYTES)
+    ranges = split_ranges(path, parts)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        partials = pool.map(
+            _count_range,
+            [path] * len(ranges),
+            [start for start, _ in ranges],
+            [end for _, end in ranges],
+            [good_min] * len(ranges),
+            [good_max] * len(ranges),
+        )
+        return merge_results(list(partials))
+
+
+def head_hash(path: str, size: int) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read(min(size, STATE_HEAD_BYTES))).hexdigest()
+
+
+def load_state(path: str, state_path: str, good_min: int, good_max: int) -> dict:
+    """Сохраненное состояние, если оно еще подходит к файлу, иначе пустое
+
+    Состояние сбрасывается, если файл стал короче (обрезали), сменился inode
+    (ротация), поменялось начало файла (перезаписали) или границы good.
+    """
+    empty = {"offset": 0, "result": {}}
+    if not os.path.exists(state_path):
+        return empty
+    with open(state_path, encoding="utf-8") as f:
+        state = json.load(f)
+
+    stat = os.stat(path)
+    if (state["good_min"], state["good_max"]) != (good_min, good_max):
+        return empty
+    if stat.st_size < state["offset"]:
+        return empty
+    if state["inode"] and stat.st_ino and state["inode"] != stat.st_ino:
+        return empty
+    if head_hash(path, state["offset"]) != state["head"]:
+        return empty
+    return state
+
+
+def save_state(state_path: str, state: dict):
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, state_path)
+
+
+def count_incremental(
+    path: str,
+    state_path: str,
+    good_min: int = GOOD_MIN,
+    good_max: int = GOOD_MAX,
+) -> Dict[str, Dict[str, int]]:
+    """Досчитывает только байты, дописанные после прошлого запуска
+
+    В состоянии хранятся счетчики по записям до последней ";" и смещение
+    сразу за ней. Запись после последней ";" может быть еще недописана,
+    поэтому она учитывается в ответе, но не в состоянии - в следующий раз
+    она будет прочитана заново.
+    """
+    state = load_state(path, state_path, good_min, good_max)
+    result = state["result"]
+    offset = state["offset"]
+
+    with open(path, "rb") as f:
+        f.seek(offset)
+        pending = b""
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            data = pending + chunk
+            cut = data.rfind(b";")
+            if cut < 0:
+                pending = data
+                continue
+            records = (r for r in data[:cut].decode("utf-8").split(";") if r != "")
+            count_good_bad(records, good_min, good_max, result)
+            offset += cut + 1
+            pending = data[cut + 1 :]
+
+    save_state(
+        state_path,
+        {
+            "offset": offset,
+            "inode": os.stat(path).st_ino,
+            "head": head_hash(path, offset),
+            "good_min": good_min,
+            "good_max": good_max,
+            "result": result,
+        },
+    )
+
+    if pending:
+        result = copy.deepcopy(result)
+        try:
+            count_good_bad([pending.decode("utf-8")], good_min, good_max, result)
+        except ValueError:
+            # запись еще дописывается
+            pass
+    return result
+
+
+def main(
+    path: str = METRIC_PATH,
+    good_min: int = GOOD_MIN,
+    good_max: int = GOOD_MAX,
+    json_path: Optional[str] = None,
+    csv_path: Optional[str] = None,
+    percentiles: bool = False,
+    state_path: Optional[str] = None,
+    workers: int = 1,
+):
+    if state_path:
+        print_report(count_incremental(path, state_path, good_min, good_max))
+        return
+
+    if workers > 1 and not (json_path or csv_path or percentiles):
+        print_report(count_parallel(path, workers, good_min, good_max))
+        return
+
+    if not (json_path or csv_path or percentiles):
+        with open(path, "r") as file:
+            result = count_good_bad(iter_records(file), good_min, good_max)
+        print_report(result)
+        return
+
+    frame = load_frame(path)
+    print_report(good_bad_from_frame(frame, good_min, good_max))
+
+    report = latency_report(frame, good_min, good_max)
+    if percentiles:
+        print(report["days"].to_string())
+    if json_path:
+        write_report_json(report, json_path, good_min, good_max)
+    if csv_path:
+        write_report_csv(report, csv_path)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Доля хороших замеров по дням")
+    arg_parser.add_argument("path", nargs="?", default=METRIC_PATH)
+    arg_parser.add_argument("--good-min", type=int, default=GOOD_MIN)
+    arg_parser.add_argument("--good-max", type=int, default=GOOD_MAX)
+    arg_parser.add_argument(
+        "--percentiles", action="store_true", help="напечатать перцентили по дням"
+    )
+    arg_parser.add_argument("--json", help="куда записать отчет по дням и часам")
+    arg_parser.add_argument("--csv", help="то же в csv")
+    arg_parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="читать только дописанное с прошлого запуска (состояние в --state)",
+    )
+    arg_parser.add_argument(
+        "--state", help="файл состояния, по умолчанию <path>.state.json"
+    )
+    arg_parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="считать полный проход в стольких процессах (по умолчанию 1)",
+    )
+    args = arg_parser.parse_args()
+    main(
+        args.path,
+        args.good_min,
+        args.good_max,
+        args.json,
+        args.csv,
+        args.percentiles,
+        (args.state or args.path + ".state.json") if args.incremental else None,
+        args.workers,
+    )
@@ -0,0 +1,390 @@
+"""Свертка сырых замеров metric.txt в поминутные корзины
+
+Хранилище - папка с колонками numpy (.npy, открываются через mmap) и meta.json:
+    minute  int64[n]          минута записи, минуты от 1970-01-01 по времени из
+                              startedAt как есть (часовой пояс не учитывается,
+                              день тот же, что у metrics_loader)
+    count   uint32[n]         число записей
+    good    uint32[n]         сколько из них в [good_min, good_max]
+    sum     int64[n]          сумма времени, мс
+    min     int64[n]          минимум времени
+    max     int64[n]          максимум времени
+    hist    uint32[n, BINS]   гистограмма времени по логарифмическим корзинам:
+                              корзина b - время в [2^(b/BINS_PER_OCTAVE),
+                              2^((b+1)/BINS_PER_OCTAVE)), время < 1 мс - в 0-й
+
+В meta.json лежат границы good, параметры гистограммы и для каждого сырого
+файла смещение, до которого он уже свернут (как в metrics_loader --incremental).
+Файл узнается по inode и хешу начала, а не по пути: переименованный при
+ротации файл досворачивается с того же места, а новый файл по старому пути
+(AsyncWriter сервера создает его заново) сворачивается с нуля.
+
+Запуск:
+    python MetricsLoader/metrics_rollup.py rollup metric.txt [--final]
+    python MetricsLoader/metrics_rollup.py report --period week [--json report.json]
+    python MetricsLoader/metrics_rollup.py prune
+"""
+
+import argparse
+import io
+import json
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from metrics_loader import GOOD_MAX, GOOD_MIN, PERCENTILES, head_hash, print_report
+
+ROLLUP_PATH = "metric_rollup"
+# Сколько байт сырого файла разбирается за раз
+READ_BYTES = 32 << 20
+
+BINS_PER_OCTAVE = 4
+# 2^24 мс - это больше 4 часов, всё дольше попадает в последнюю корзину
+BINS = 24 * BINS_PER_OCTAVE
+
+COLUMNS = ("minute", "count", "good", "sum", "min", "max", "hist")
+PERIODS = ("day", "week", "month")
+
+
+def latency_bins(time: np.ndarray) -> np.ndarray:
+    bins = np.floor(np.log2(np.maximum(time, 1)) * BINS_PER_OCTAVE)
+    return np.clip(bins, 0, BINS - 1).astype(np.int64)
+
+
+def bin_value(bins: np.ndarray) -> np.ndarray:
+    """Середина корзины (геометрическая) - ею оцениваются перцентили"""
+    return 2 ** ((bins + 0.5) / BINS_PER_OCTAVE)
+
+
+def _empty() -> Dict[str, np.ndarray]:
+    return {
+        "minute": np.empty(0, np.int64),
+        "count": np.empty(0, np.uint32),
+        "good": np.empty(0, np.uint32),
+        "sum": np.empty(0, np.int64),
+        "min": np.empty(0, np.int64),
+        "max": np.empty(0, np.int64),
+        "hist": np.empty((0, BINS), np.uint32),
+    }
+
+
+def combine(parts: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+    """Складывает корзины с одинаковой минутой; результат отсортирован по минуте"""
+    parts = [p for p in parts if len(p["minute"])]
+    if not parts:
+        return _empty()
+    joined = {name: np.concatenate([p[name] for p in parts]) for name in COLUMNS}
+    minutes, inverse = np.unique(joined["minute"], return_inverse=True)
+    n = len(minutes)
+
+    out = {"minute": minutes}
+    for name in ("count", "good"):
+        out[name] = np.bincount(inverse, joined[name], n).astype(np.uint32)
+    out["sum"] = np.zeros(n, np.int64)
+    np.add.at(out["sum"], inverse, joined["sum"])
+    out["min"] = np.full(n, np.iinfo(np.int64).max)
+    np.minimum.at(out["min"], inverse, joined["min"])
+    out["max"] = np.full(n, np.iinfo(np.int64).min)
+    np.maximum.at(out["max"], inverse, joined["max"])
+    out["hist"] = np.zeros((n, BINS), np.uint32)
+    np.add.at(out["hist"], inverse, joined["hist"])
+    return out
+
+
+def rollup_records(data: bytes, good_min: int, good_max: int) -> Dict[str, np.ndarray]:
+    """Корзины по куску сырого файла (целые записи, разделенные ";")"""
+    frame = pd.read_csv(
+        io.BytesIO(data),
+        sep=" ",
+        lineterminator=";",
+        header=None,
+        names=["started_at", "time"],
+        dtype={"started_at": str, "time": np.int64},
+    )
+    if frame.empty:
+        return _empty()
+    minute = (
+        pd.to_datetime(frame["started_at"].str[:16], format="%Y-%m-%dT%H:%M")
+        .to_numpy()
+        .astype("datetime64[m]")
+        .astype(np.int64)
+    )
+    time = frame["time"].to_numpy()
+    minutes, inverse = np.unique(minute, return_inverse=True)
+    n = len(minutes)
+
+    good = (time >= good_min) & (time <= good_max)
+    out = {
+        "minute": minutes,
+        "count": np.bincount(inverse, minlength=n).astype(np.uint32),
+        "good": np.bincount(inverse, good, n).astype(np.uint32),
+        "sum": np.zeros(n, np.int64),
+        "min": np.full(n, np.iinfo(np.int64).max),
+        "max": np.full(n, np.iinfo(np.int64).min),
+    }
+    np.add.at(out["sum"], inverse, time)
+    np.minimum.at(out["min"], inverse, time)
+    np.maximum.at(out["max"], inverse, time)
+    out["hist"] = (
+        np.bincount(inverse * BINS + latency_bins(time), minlength=n * BINS)
+        .reshape(n, BINS)
+        .astype(np.uint32)
+    )
+    return out
+
+
+class RollupStore:
+    def __init__(self, path: str = ROLLUP_PATH):
+        self.path = path
+        self.meta_path = os.path.join(path, "meta.json")
+
+    def exists(self) -> bool:
+        return os.path.exists(self.meta_path)
+
+    def load_meta(self) -> dict:
+        with open(self.meta_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def load(self, mmap_mode: Optional[str] = "r") -> Dict[str, np.ndarray]:
+        if not self.exists():
+            return _empty()
+        return {
+            name: np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in COLUMNS
+        }
+
+    def save(self, columns: Dict[str, np.ndarray], meta: dict):
+        """Колонки пишутся во временные файлы и подменяются, meta.json - последним"""
+        os.makedirs(self.path, exist_ok=True)
+        for name in COLUMNS:
+            tmp_path = os.path.join(self.path, f"{name}.tmp.npy")
+            np.save(tmp_path, columns[name])
+            os.replace(tmp_path, os.path.join(self.path, f"{name}.npy"))
+        self.save_meta(meta)
+
+    def save_meta(self, meta: dict):
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.meta_path)
+
+
+def source_key(raw_path: str) -> str:
+    """Ключ файла в meta["sources"]: inode, а где его нет - абсолютный путь"""
+    inode = os.stat(raw_path).st_ino
+    return str(inode) if inode else os.path.abspath(raw_path)
+
+
+def same_source(raw_path: str, source: dict) -> bool:
+    """Тот же ли это файл: начало, свернутое до source["offset"], не поменялось"""
+    return head_hash(raw_path, source["offset"]) == source["head"]
+
+
+def rollup(
+    raw_path: str,
+    store: RollupStore,
+    final: bool = False,
+    good_min: int = GOOD_MIN,
+    good_max: int = GOOD_MAX,
+) -> int:
+    """Досворачивает в хранилище то, что дописано в raw_path; возвращает число записей
+
+    Запись после последней ";" может быть недописана и без final остается на
+    следующий раз; final - файл больше не пишется (ротирован), берем всё.
+    Файл с тем же inode, но другим началом - новый файл, он сворачивается с
+    нуля. Если же начало то же, а файл стал короче (обрезали), свернутое из
+    него уже не отделить - тогда ошибка, а не двойной счет.
+    """
+    if store.exists():
+        meta = store.load_meta()
+        if (meta["good_min"], meta["good_max"]) != (good_min, good_max):
+            raise RuntimeError("rollup store was built with another good window")
+        if meta["bins_per_octave"] != BINS_PER_OCTAVE or meta["bins"] != BINS:
+            raise RuntimeError("rollup store was built with another histogram")
+    else:
+        meta = {
+            "good_min": good_min,
+            "good_max": good_max,
+            "bins_per_octave": BINS_PER_OCTAVE,
+            "bins": BINS,
+            "sources": {},
+        }
+
+    key = source_key(raw_path)
+    source = meta["sources"].get(key)
+    if source is None or not same_source(raw_path, source):
+        source = {"offset": 0, "head": head_hash(raw_path, 0)}
+    offset = source["offset"]
+    if os.path.getsize(raw_path) < offset:
+        raise RuntimeError(f"{raw_path} was truncated after rollup")
+
+    parts = []
+    records = 0
+    with open(raw_path, "rb") as f:
+        f.seek(offset)
+        pending = b""
+        while True:
+            chunk = f.read(READ_BYTES)
+            if not chunk:
+                break
+            data = pending + chunk
+            cut = data.rfind(b";")
+            if cut < 0:
+                pending = data
+                continue
+            parts.append(rollup_records(data[:cut], good_min, good_max))
+            records += int(parts[-1]["count"].sum())
+            offset += cut + 1
+            pending = data[cut + 1 :]
+        if final and pending:
+            parts.append(rollup_records(pending, good_min, good_max))
+            records += int(parts[-1]["count"].sum())
+            offset += len(pending)
+
+    if not parts and store.exists():
+        return 0
+    columns = combine([store.load(mmap_mode=None)] + parts)
+    meta["sources"][key] = {
+        "path": os.path.abspath(raw_path),
+        "offset": offset,
+        "head": head_hash(raw_path, offset),
+    }
+    store.save(columns, meta)
+    return records
+
+
+def prune(store: RollupStore) -> List[str]:
+    """Удаляет сырые файлы, свернутые целиком (смещение дошло до конца файла)
+
+    Вместе с файлом из meta уходит и его запись: новый файл с тем же путем
+    или inode сворачивается как новый.
+    """
+    meta = store.load_meta()
+    removed = []
+    for key, source in list(meta["sources"].items()):
+        path = source["path"]
+        if (
+            os.path.exists(path)
+            and source_key(path) == key
+            and os.path.getsize(path) == source["offset"]
+            and same_source(path, source)
+        ):
+            os.remove(path)
+            removed.append(path)
+            del meta["sources"][key]
+    if removed:
+        store.save_meta(meta)
+    return removed
+
+
+def period_start(minute: np.ndarray, period: str) -> np.ndarray:
+    """Начало дня, недели (понедельник) или месяца минуты, как datetime64[D]"""
+    day = minute.astype("datetime64[m]").astype("datetime64[D]")
+    if period == "day":
+        return day
+    if period == "week":
+        # 1970-01-01 - четверг
+        return day - ((day.astype(np.int64) + 3) % 7).astype("timedelta64[D]")
+    if period == "month":
+        return day.astype("datetime64[M]").astype("datetime64[D]")
+    raise ValueError(f"unknown period: {period}")
+
+
+def histogram_percentiles(hist: np.ndarray, percents=PERCENTILES) -> np.ndarray:
+    """Оценка перцентилей по строкам гистограммы: [rows, len(percents)]"""
+    cumulative = np.cumsum(hist, axis=1, dtype=np.int64)
+    total = cumulative[:, -1:]
+    out = np.empty((len(hist), len(percents)))
+    for i, p in enumerate(percents):
+        rank = np.ceil(total * p / 100).clip(min=1)
+        out[:, i] = bin_value(np.argmax(cumulative >= rank, axis=1))
+    return out
+
+
+def report(store: RollupStore, period: str = "day") -> pd.DataFrame:
+    """Число записей, good/bad, среднее, min/max и перцентили по периодам
+
+    Перцентили - оценка по гистограмме, с точностью до корзины
+    (2^(1/BINS_PER_OCTAVE), то есть примерно +-9%).
+    """
+    columns = store.load()
+    starts = period_start(np.asarray(columns["minute"]), period)
+    periods, inverse = np.unique(starts, return_inverse=True)
+    n = len(periods)
+
+    count = np.bincount(inverse, columns["count"], n).astype(np.int64)
+    good = np.bincount(inverse, columns["good"], n).astype(np.int64)
+    total = np.bincount(inverse, columns["sum"], n)
+    low = np.full(n, np.iinfo(np.int64).max)
+    np.minimum.at(low, inverse, columns["min"])
+    high = np.full(n, np.iinfo(np.int64).min)
+    np.maximum.at(high, inverse, columns["max"])
+    hist = np.zeros((n, BINS), np.int64)
+    np.add.at(hist, inverse, columns["hist"])
+
+    table = pd.DataFrame(
+        {
+            "count": count,
+            "good": good,
+            "bad": count - good,
+            "good_pct": (good / np.maximum(count, 1) * 100).round(2),
+            "mean": (total / np.maximum(count, 1)).round(1),
+            "min": low,
+        },
+        index=pd.Index(periods.astype(str), name=period),
+    )
+    # середина корзины может выйти за реальные min/max периода
+    estimates = np.clip(histogram_percentiles(hist), low[:, None], high[:, None])
+    for i, p in enumerate(PERCENTILES):
+        table[f"p{p}"] = estimates[:, i].round(1)
+    table["max"] = high
+    return table
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Поминутная свертка metric.txt")
+    arg_parser.add_argument("--store", default=ROLLUP_PATH)
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+
+    rollup_parser = commands.add_parser("rollup", help="досвернуть сырые файлы")
+    rollup_parser.add_argument("paths", nargs="+")
+    rollup_parser.add_argument(
+        "--final", action="store_true", help="файлы больше не пишутся, взять и хвост"
+    )
+    rollup_parser.add_argument("--good-min", type=int, default=GOOD_MIN)
+    rollup_parser.add_argument("--good-max", type=int, default=GOOD_MAX)
+
+    report_parser = commands.add_parser("report", help="отчет по свертке")
+    report_parser.add_argument("--period", choices=PERIODS, default="day")
+    report_parser.add_argument("--json", help="куда записать отчет")
+
+    commands.add_parser("prune", help="удалить целиком свернутые сырые файлы")
+
+    args = arg_parser.parse_args()
+    store = RollupStore(args.store)
+
+    if args.command == "rollup":
+        for path in args.paths:
+            records = rollup(path, store, args.final, args.good_min, args.good_max)
+            print(path, records)
+    elif args.command == "report":
+        table = report(store, args.period)
+        if args.period == "day":
+            print_report(
+                {
+                    day: {"good": int(row["good"]), "bad": int(row["bad"])}
+                    for day, row in table.iterrows()
+                }
+            )
+        print(table.to_string())
+        if args.json:
+            table.reset_index().to_json(args.json, orient="records", indent=2)
+    elif args.command == "prune":
+        for path in prune(store):
+            print("removed", path)
+
+
+if __name__ == "__main__":
+    main()